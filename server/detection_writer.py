@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Threaded Detection Writer Module
+Inserts detection rows on a background thread in batches so database round-trips overlap analysis
+"""
+
+import queue
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class ThreadedDetectionWriter:
+    """Consumer thread that batches INSERT rows from a bounded queue into executemany calls"""
+
+    def __init__(self, connect: Callable[[], Any], batch_size: int = 64, queue_size: int = 256):
+        """
+        Initialize the detection writer
+
+        Args:
+            connect: Callable returning a new database connection (or None on failure),
+                the writer thread uses its own connection since connections aren't thread safe
+            batch_size: Number of queued rows written per executemany + commit
+            queue_size: Maximum number of rows buffered ahead of the writer
+        """
+        self.connect = connect
+        self.batch_size = max(1, int(batch_size))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.rows_written = 0
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+
+    def start(self) -> 'ThreadedDetectionWriter':
+        """Start the background writer thread"""
+        self.thread.start()
+        return self
+
+    def put(self, sql: str, params: Any):
+        """
+        Queue one row for insertion, blocking while the queue is full
+
+        Args:
+            sql: INSERT statement with placeholders
+            params: Parameters for one row
+        """
+        self.queue.put((sql, params))
+
+    def _flush(self, conn, batch: Dict[str, List[Any]]):
+        """Write all buffered rows, one executemany per statement, then commit once"""
+        if not batch:
+            return
+        if conn is not None:
+            try:
+                cursor = conn.cursor()
+                for sql, rows in batch.items():
+                    # A failing statement (e.g. a missing table) doesn't drop the other statements' rows
+                    try:
+                        cursor.executemany(sql, rows)
+                        self.rows_written += len(rows)
+                    except Exception as e:
+                        logger.error(f"Error writing {len(rows)} rows ({sql.split('(')[0].strip()}): {e}")
+                conn.commit()
+                cursor.close()
+            except Exception as e:
+                logger.error(f"Error writing detections: {e}")
+        batch.clear()
+
+    def _writer(self):
+        """Collect rows until a batch is full or the stream ends, then write them"""
+        conn = None
+        try:
+            conn = self.connect()
+            if conn is None:
+                logger.error("Detection writer could not connect to database, dropping rows")
+        except Exception as e:
+            logger.error(f"Detection writer could not connect to database: {e}")
+
+        batch: Dict[str, List[Any]] = {}
+        pending = 0
+        try:
+            while True:
+                item: Optional[Tuple[str, Any]] = self.queue.get()
+                if item is None:
+                    break
+                sql, params = item
+                batch.setdefault(sql, []).append(params)
+                pending += 1
+                if pending >= self.batch_size:
+                    self._flush(conn, batch)
+                    pending = 0
+        finally:
+            self._flush(conn, batch)
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        """Write any remaining rows and wait for the writer thread to finish"""
+        if self.thread.is_alive():
+            # Sentinel marks the end of the stream
+            self.queue.put(None)
+            self.thread.join()
+
+    def __enter__(self) -> 'ThreadedDetectionWriter':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
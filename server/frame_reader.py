@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Threaded Frame Reader Module
+Decodes video frames on a background thread so analysis can overlap decoding
+"""
+
+import queue
+import threading
+import logging
+from typing import Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import cv2
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+def batched(items: Iterable[T], n: int) -> Iterator[List[T]]:
+    """
+    Group items into lists of up to n, for feeding frames to batched inference
+
+    Args:
+        items: Items to group, e.g. a ThreadedFrameReader or a generator filtering its frames
+        n: Maximum batch size
+
+    Returns:
+        Iterator over full batches of n items, then one shorter batch with any remainder
+    """
+    n = max(1, int(n))
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class ThreadedFrameReader:
+    """Producer thread that reads sampled frames from a VideoCapture into a bounded queue"""
+
+    def __init__(self, cap: cv2.VideoCapture, sample_interval: int = 1, queue_size: int = 64,
+                 seek: bool = False):
+        """
+        Initialize the frame reader
+
+        Args:
+            cap: Opened cv2.VideoCapture to read from
+            sample_interval: Only decode every Nth frame, skipped frames are grabbed without decoding
+            queue_size: Maximum number of decoded frames buffered ahead of the consumer
+            seek: Jump to each sampled frame with CAP_PROP_POS_FRAMES instead of grabbing
+                the skipped ones (only use when the backend seeks accurately)
+        """
+        self.cap = cap
+        self.sample_interval = max(1, int(sample_interval))
+        self.seek = seek
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.frames_read = 0
+        self.thread = threading.Thread(target=self._reader, daemon=True)
+
+    def start(self) -> 'ThreadedFrameReader':
+        """Start the background reader thread"""
+        self.thread.start()
+        return self
+
+    def _put(self, item: Optional[Tuple[int, np.ndarray]]) -> bool:
+        """Put an item on the queue, giving up if the reader is stopped"""
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _reader(self):
+        """Decode sampled frames and grab (or seek past) the rest until the video ends"""
+        frame_number = 0
+        try:
+            while not self.stopped.is_set():
+                if frame_number % self.sample_interval == 0:
+                    if self.seek and frame_number > 0:
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+                    ret, frame = self.cap.read()
+                    if not ret:
+                        break
+                    if not self._put((frame_number, frame)):
+                        break
+                    if self.seek:
+                        frame_number += self.sample_interval
+                        continue
+                elif not self.cap.grab():
+                    break
+                frame_number += 1
+        except Exception as e:
+            logger.error(f"Error reading video frames: {e}")
+        finally:
+            self.frames_read = frame_number
+            # Sentinel marks the end of the stream
+            self._put(None)
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """Yield (frame_number, frame) tuples until the video ends"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            yield item
+
+    def stop(self):
+        """Stop the reader thread and discard any buffered frames"""
+        self.stopped.set()
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def __enter__(self) -> 'ThreadedFrameReader':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
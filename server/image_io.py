@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Image I/O Module
+JPEG writing for saved frames and face crops, using libjpeg-turbo when available
+"""
+
+import logging
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Iterable
+
+import cv2
+import numpy as np
+
+# Optional libjpeg-turbo encoder for saved frames, falls back to cv2.imencode
+try:
+    from turbojpeg import TurboJPEG
+    turbo_jpeg = TurboJPEG()
+    HAS_TURBOJPEG = True
+except (ImportError, RuntimeError):
+    # RuntimeError: PyTurboJPEG is installed but the libturbojpeg library was not found
+    HAS_TURBOJPEG = False
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# JPEG settings for every saved frame, face crop and result image. Quality 85 without
+# progressive encoding gives smaller files that encode faster than OpenCV's default of 95
+JPEG_QUALITY = 85
+JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY, cv2.IMWRITE_JPEG_OPTIMIZE, 1, cv2.IMWRITE_JPEG_PROGRESSIVE, 0]
+
+def write_jpeg(path: str, image: np.ndarray) -> bool:
+    """
+    Encode an image as JPEG in memory and write it to disk in one call
+
+    Args:
+        path: Output file path
+        image: BGR image to encode
+
+    Returns:
+        True if the image was written
+    """
+    if HAS_TURBOJPEG:
+        # Input is BGR, TurboJPEG's default pixel format
+        Path(path).write_bytes(turbo_jpeg.encode(image, quality=JPEG_QUALITY))
+        return True
+
+    ok, buffer = cv2.imencode('.jpg', image, JPEG_PARAMS)
+    if not ok:
+        logger.error(f"Failed to encode image: {path}")
+        return False
+    Path(path).write_bytes(buffer)
+    return True
+
+def check_writes(futures: Iterable[Future]) -> int:
+    """
+    Wait for write_jpeg calls submitted to an executor and log the ones that failed
+
+    Args:
+        futures: Futures returned by submitting write_jpeg
+
+    Returns:
+        Number of images that were not written
+    """
+    failed = 0
+    for future in futures:
+        try:
+            written = future.result()
+        except Exception as e:
+            logger.error(f"Error writing image: {e}")
+            written = False
+        if not written:
+            failed += 1
+    return failed
@@ -10,6 +10,87 @@ import math
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Optional Numba JIT for the fused lighting-metric kernel
+try:
+    import numba
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+# Intensity levels of a uint8 grayscale image
+GRAY_LEVELS = np.arange(256, dtype=np.float64)
+
+if HAS_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _gray_histogram_kernel(flat: np.ndarray, num_chunks: int) -> np.ndarray:
+        """Single pass 256-bin histogram with thread-local bins merged at the end"""
+        n = flat.size
+        chunk_size = (n + num_chunks - 1) // num_chunks
+        local_hist = np.zeros((num_chunks, 256), dtype=np.int64)
+        for c in prange(num_chunks):
+            start = c * chunk_size
+            end = min(start + chunk_size, n)
+            for i in range(start, end):
+                local_hist[c, flat[i]] += 1
+        return local_hist.sum(axis=0)
+
+
+def compute_gray_histogram(gray: np.ndarray) -> np.ndarray:
+    """
+    Compute a 256-bin histogram of a uint8 grayscale image in a single pass
+    
+    Args:
+        gray: Single-channel uint8 image
+        
+    Returns:
+        Array of 256 pixel counts
+    """
+    gray = np.ascontiguousarray(gray)
+    if HAS_NUMBA:
+        return _gray_histogram_kernel(gray.ravel(), numba.get_num_threads())
+    # OpenCV's uint8 calcHist path is SIMD/IPP accelerated
+    return cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+
+
+def metrics_from_histogram(hist: np.ndarray, bright_pixel_threshold: float) -> Dict:
+    """
+    Derive global brightness metrics from a 256-bin grayscale histogram
+    
+    Args:
+        hist: 256-bin pixel counts from compute_gray_histogram
+        bright_pixel_threshold: Pixels above this are considered bright
+        
+    Returns:
+        Dictionary with brightness metrics
+    """
+    total_pixels = hist.sum()
+    nonzero = np.flatnonzero(hist)
+    
+    mean = float(np.dot(hist, GRAY_LEVELS) / total_pixels)
+    variance = float(np.dot(hist, (GRAY_LEVELS - mean) ** 2) / total_pixels)
+    
+    # Median matches np.median: average the two middle values for even counts
+    cumulative = np.cumsum(hist)
+    upper = np.searchsorted(cumulative, total_pixels // 2, side='right')
+    if total_pixels % 2 == 0:
+        lower = np.searchsorted(cumulative, total_pixels // 2 - 1, side='right')
+        median = (lower + upper) / 2.0
+    else:
+        median = float(upper)
+    
+    # Integer pixels above the threshold start at floor(threshold) + 1
+    bright_start = min(256, max(0, int(math.floor(bright_pixel_threshold)) + 1))
+    
+    return {
+        'mean_brightness': mean,
+        'median_brightness': median,
+        'std_brightness': math.sqrt(variance),
+        'min_brightness': int(nonzero[0]),
+        'max_brightness': int(nonzero[-1]),
+        'bright_pixel_ratio': hist[bright_start:].sum() / total_pixels
+    }
+
 class LightDetector:
     def __init__(self, config: Dict = None):
         """
@@ -80,7 +161,7 @@ class LightDetector:
         Returns:
             Preprocessed frame
         """
-        processed_frame = frame.copy()
+        processed_frame = frame
         
         # Resize for faster analysis if configured
         if self.config['resize_for_analysis']:
@@ -92,13 +173,15 @@ class LightDetector:
         
         return processed_frame
     
-    def calculate_brightness_metrics(self, frame: np.ndarray, roi_regions: List = None) -> Dict:
+    def calculate_brightness_metrics(self, frame: np.ndarray, roi_regions: List = None,
+                                     hist: np.ndarray = None) -> Dict:
         """
         Calculate various brightness metrics for the frame
         
         Args:
             frame: Input frame (BGR or grayscale)
             roi_regions: Optional list of ROI regions [(x1, y1, x2, y2), ...]
+            hist: Optional precomputed 256-bin histogram of the grayscale frame
             
         Returns:
             Dictionary with brightness metrics
@@ -109,19 +192,25 @@ class LightDetector:
         else:
             gray = frame
         
-        metrics = {}
-        
-        # Global brightness metrics
-        metrics['mean_brightness'] = np.mean(gray)
-        metrics['median_brightness'] = np.median(gray)
-        metrics['std_brightness'] = np.std(gray)
-        metrics['min_brightness'] = np.min(gray)
-        metrics['max_brightness'] = np.max(gray)
-        
-        # Brightness distribution
-        bright_pixels = np.sum(gray > self.config['bright_pixel_threshold'])
-        total_pixels = gray.size
-        metrics['bright_pixel_ratio'] = bright_pixels / total_pixels
+        if gray.dtype == np.uint8 and gray.size > 0:
+            # Fused single pass over the pixels, all metrics derived from the histogram
+            if hist is None:
+                hist = compute_gray_histogram(gray)
+            metrics = metrics_from_histogram(hist, self.config['bright_pixel_threshold'])
+        else:
+            metrics = {}
+            
+            # Global brightness metrics
+            metrics['mean_brightness'] = np.mean(gray)
+            metrics['median_brightness'] = np.median(gray)
+            metrics['std_brightness'] = np.std(gray)
+            metrics['min_brightness'] = np.min(gray)
+            metrics['max_brightness'] = np.max(gray)
+            
+            # Brightness distribution
+            bright_pixels = np.sum(gray > self.config['bright_pixel_threshold'])
+            total_pixels = gray.size
+            metrics['bright_pixel_ratio'] = bright_pixels / total_pixels
         
         # ROI analysis if regions are specified
         if roi_regions:
@@ -147,12 +236,13 @@ class LightDetector:
         
         return metrics
     
-    def calculate_histogram_metrics(self, frame: np.ndarray) -> Dict:
+    def calculate_histogram_metrics(self, frame: np.ndarray, hist: np.ndarray = None) -> Dict:
         """
         Calculate histogram-based lighting metrics
         
         Args:
             frame: Input frame
+            hist: Optional precomputed 256-bin histogram of the grayscale frame
             
         Returns:
             Dictionary with histogram metrics
@@ -164,8 +254,15 @@ class LightDetector:
             gray = frame
         
         # Calculate histogram
-        hist = cv2.calcHist([gray], [0], None, [self.config['histogram_bins']], [0, 256])
-        hist = hist.flatten() / gray.size  # Normalize
+        bins = self.config['histogram_bins']
+        if gray.dtype == np.uint8 and 256 % bins == 0:
+            # Fold the full 256-bin histogram into equal-width bins
+            if hist is None:
+                hist = compute_gray_histogram(gray)
+            hist = hist.reshape(bins, -1).sum(axis=1)
+        else:
+            hist = cv2.calcHist([gray], [0], None, [bins], [0, 256]).flatten()
+        hist = hist / gray.size  # Normalize
         
         metrics = {}
         
@@ -341,13 +438,15 @@ class LightDetector:
         classification['reasoning'] = reasoning
         return classification
     
-    def analyze_frame(self, frame: np.ndarray, timestamp: datetime = None) -> Dict:
+    def analyze_frame(self, frame: np.ndarray, timestamp: datetime = None,
+                      gray: np.ndarray = None) -> Dict:
         """
         Main method to analyze a frame for lighting conditions
         
         Args:
             frame: Input BGR frame
             timestamp: Optional timestamp for the frame
+            gray: Optional grayscale version of the frame, skips the BGR conversion
             
         Returns:
             Dictionary with complete analysis results
@@ -355,16 +454,24 @@ class LightDetector:
         if timestamp is None:
             timestamp = datetime.now()
         
-        # Preprocess frame
-        processed_frame = self.preprocess_frame(frame)
+        # Preprocess frame and convert to grayscale once for all metrics
+        if gray is None:
+            gray = self.preprocess_frame(frame)
+            if len(gray.shape) == 3:
+                gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = self.preprocess_frame(gray)
+        
+        hist = compute_gray_histogram(gray) if gray.dtype == np.uint8 and gray.size > 0 else None
         
         # Calculate metrics
         brightness_metrics = self.calculate_brightness_metrics(
-            processed_frame, 
-            self.config.get('roi_regions')
+            gray, 
+            self.config.get('roi_regions'),
+            hist=hist
         )
         
-        histogram_metrics = self.calculate_histogram_metrics(processed_frame)
+        histogram_metrics = self.calculate_histogram_metrics(gray, hist=hist)
         
         temporal_changes = self.detect_temporal_changes(brightness_metrics)
         
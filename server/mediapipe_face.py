@@ -32,6 +32,7 @@ FACE_WIDTH = 112  # Required size for InsightFace
 FACE_HEIGHT = 112  # Required size for InsightFace
 FACE_DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mediapipe_face_db.pkl')
 DETECTION_CONFIDENCE = 0.5  # Minimum confidence for MediaPipe face detection
+DETECTION_LONG_EDGE = 640  # Frames are downscaled to this long edge before MediaPipe detection
 RECOGNITION_THRESHOLD = 0.90  # Cosine similarity threshold (0.9 for high confidence)
 
 # Database configuration
@@ -47,6 +48,7 @@ face_detector = None
 face_mesh = None  # Added for alignment
 insightface_model = None
 face_database = {}  # Format: {name: {'role': role, 'embeddings': [list of embeddings], 'access': {...}}}
+embedding_index = None  # Cached (matrix, owners, names) built from face_database, see get_embedding_index
 model_initialized = False
 
 # Standard face landmark positions for alignment (eyes centers)
@@ -107,6 +109,7 @@ def load_known_faces_from_db():
                 except Exception as e:
                     logger.error(f"Error parsing face encoding for {face.get('name', 'Unknown')}: {e}")
         
+        invalidate_embedding_index()
         logger.info(f"Loaded {len(face_database)} known faces from database")
         return True
     except Exception as e:
@@ -249,8 +252,16 @@ def detect_faces(image: np.ndarray) -> List[Dict]:
         if not init_face_recognition():
             return []
     
+    # MediaPipe returns relative boxes, so detect on a downscaled copy and crop from the original
+    image_height, image_width, _ = image.shape
+    scale = DETECTION_LONG_EDGE / max(image_height, image_width)
+    if scale < 1.0:
+        small = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        small = image
+    
     # Make sure image is in RGB format for MediaPipe
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    image_rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
     
     # Detect faces
     results = face_detector.process(image_rgb)
@@ -258,7 +269,6 @@ def detect_faces(image: np.ndarray) -> List[Dict]:
     # Process results
     faces = []
     if results.detections:
-        image_height, image_width, _ = image.shape
         for detection in results.detections:
             # Get bounding box
             bbox = detection.location_data.relative_bounding_box
@@ -345,30 +355,35 @@ def detect_faces(image: np.ndarray) -> List[Dict]:
     
     return faces
 
-def extract_faces_from_image(image_path: str) -> List[Dict]:
-    """Extract faces from an image file
+def detect_faces_batch(images: List[np.ndarray]) -> List[List[Dict]]:
+    """Detect faces in a batch of images
+    
+    MediaPipe's face detection solution takes one image per call, so the images
+    are run through the detector in order. Callers collect frames into batches
+    here so a batched detector backend can be swapped in without changing them.
     
     Args:
-        image_path: Path to the image file
+        images: Input images (BGR format)
+        
+    Returns:
+        One list of face dictionaries per input image, in the same order
+    """
+    if face_detector is None:
+        if not init_face_recognition():
+            return [[] for _ in images]
+    
+    return [detect_faces(image) for image in images]
+
+def extract_faces_from_numpy(image: np.ndarray) -> List[Dict]:
+    """Extract faces from an already decoded image
+    
+    Args:
+        image: Image in BGR format
         
     Returns:
         List of face dictionaries with bounding box and embedding
     """
     try:
-        # Load image
-        image = cv2.imread(image_path)
-        if image is None:
-            logger.error(f"Error loading image: {image_path}")
-            return []
-        
-        # Log image shape for debugging
-        logger.info(f"Image shape: {image.shape}")
-        
-        # Save a debugging copy of the image
-        debug_path = os.path.join(os.path.dirname(image_path), f"debug_{os.path.basename(image_path)}")
-        cv2.imwrite(debug_path, image)
-        logger.info(f"Saved debug image to {debug_path}")
-        
         # Redirect stdout during processing to prevent JSON contamination
         old_stdout = sys.stdout
         sys.stdout = sys.stderr
@@ -435,27 +450,6 @@ def extract_faces_from_image(image_path: str) -> List[Dict]:
                 except Exception as e:
                     logger.error(f"InsightFace detection error: {e}")
             
-            # Keep track of original image path
-            for face in faces:
-                face['image_path'] = image_path
-            
-            # Save debug images for each detected face
-            for i, face in enumerate(faces):
-                try:
-                    # Save original face crop
-                    face_debug_path = os.path.join(os.path.dirname(image_path), 
-                                                  f"debug_face_{i}_{os.path.basename(image_path)}")
-                    cv2.imwrite(face_debug_path, face['face_image'])
-                    
-                    # Save aligned face
-                    aligned_debug_path = os.path.join(os.path.dirname(image_path), 
-                                                     f"debug_aligned_face_{i}_{os.path.basename(image_path)}")
-                    cv2.imwrite(aligned_debug_path, face['aligned_face'])
-                    
-                    logger.info(f"Saved debug face images to {face_debug_path} and {aligned_debug_path}")
-                except Exception as e:
-                    logger.error(f"Error saving debug face image: {e}")
-                
             return faces
         finally:
             # Restore stdout
@@ -465,6 +459,60 @@ def extract_faces_from_image(image_path: str) -> List[Dict]:
         logger.error(f"Error extracting faces from image: {e}")
         return []
 
+def extract_faces_from_image(image_path: str, image: Optional[np.ndarray] = None) -> List[Dict]:
+    """Extract faces from an image file
+    
+    Args:
+        image_path: Path to the image file
+        image: Optional already decoded image (BGR format), skips reading image_path again
+        
+    Returns:
+        List of face dictionaries with bounding box and embedding
+    """
+    try:
+        # Load image
+        if image is None:
+            image = cv2.imread(image_path)
+        if image is None:
+            logger.error(f"Error loading image: {image_path}")
+            return []
+        
+        # Log image shape for debugging
+        logger.info(f"Image shape: {image.shape}")
+        
+        # Save a debugging copy of the image
+        debug_path = os.path.join(os.path.dirname(image_path), f"debug_{os.path.basename(image_path)}")
+        cv2.imwrite(debug_path, image)
+        logger.info(f"Saved debug image to {debug_path}")
+        
+        faces = extract_faces_from_numpy(image)
+        
+        # Keep track of original image path
+        for face in faces:
+            face['image_path'] = image_path
+        
+        # Save debug images for each detected face
+        for i, face in enumerate(faces):
+            try:
+                # Save original face crop
+                face_debug_path = os.path.join(os.path.dirname(image_path), 
+                                              f"debug_face_{i}_{os.path.basename(image_path)}")
+                cv2.imwrite(face_debug_path, face['face_image'])
+                
+                # Save aligned face
+                aligned_debug_path = os.path.join(os.path.dirname(image_path), 
+                                                 f"debug_aligned_face_{i}_{os.path.basename(image_path)}")
+                cv2.imwrite(aligned_debug_path, face['aligned_face'])
+                
+                logger.info(f"Saved debug face images to {face_debug_path} and {aligned_debug_path}")
+            except Exception as e:
+                logger.error(f"Error saving debug face image: {e}")
+            
+        return faces
+    except Exception as e:
+        logger.error(f"Error extracting faces from image: {e}")
+        return []
+
 def add_face_to_database(name: str, role: str, face_data: Union[Dict, List[Dict]], access_areas: Dict = None) -> bool:
     """Add a face or faces to the database
     
@@ -519,6 +567,7 @@ def add_face_to_database(name: str, role: str, face_data: Union[Dict, List[Dict]
             face_database[name]['embeddings'].extend(embeddings)
             face_database[name]['role'] = role
             face_database[name]['access'] = access_areas
+        invalidate_embedding_index()
         
         # Save database
         with open(FACE_DB_FILE, 'wb') as f:
@@ -530,6 +579,89 @@ def add_face_to_database(name: str, role: str, face_data: Union[Dict, List[Dict]
         logger.error(f"Error adding face to database: {e}")
         return False
 
+def invalidate_embedding_index():
+    """Drop the cached embedding matrix, call after changing face_database"""
+    global embedding_index
+    embedding_index = None
+
+def get_embedding_index() -> Optional[Tuple[np.ndarray, np.ndarray, List[str]]]:
+    """Get the L2-normalized matrix of all known embeddings, building it if needed
+    
+    Returns:
+        (matrix, owners, names) where row i of the (K, D) float32 matrix belongs to
+        names[owners[i]], or None if the database is empty or mixes embedding dimensions
+    """
+    global embedding_index
+    
+    if embedding_index is None:
+        vectors = []
+        owners = []
+        names = []
+        for name, identity in face_database.items():
+            if len(identity['embeddings']) == 0:
+                continue
+            names.append(name)
+            for embedding in identity['embeddings']:
+                vectors.append(np.asarray(embedding, dtype=np.float32).ravel())
+                owners.append(len(names) - 1)
+        
+        matrix = None
+        if vectors and len({vector.shape[0] for vector in vectors}) == 1:
+            matrix = np.stack(vectors)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms > 0, norms, 1)
+        embedding_index = (matrix, np.array(owners), names)
+    
+    matrix, owners, names = embedding_index
+    if matrix is None:
+        return None
+    return matrix, owners, names
+
+def _match_embedding_index(face_embeddings: np.ndarray, threshold: float) -> Optional[List[Tuple[Optional[str], float]]]:
+    """Match faces against the cached embedding matrix with a single matrix product
+    
+    Args:
+        face_embeddings: (M, D) matrix with one face embedding per row
+        threshold: Similarity threshold (higher = more strict)
+        
+    Returns:
+        (name, similarity) per face with name None for unknown faces, or None if the
+        index cannot be used for these embeddings
+    """
+    index = get_embedding_index()
+    if index is None or index[0].shape[1] != face_embeddings.shape[1]:
+        return None
+    matrix, owners, names = index
+    
+    queries = np.asarray(face_embeddings, dtype=np.float32)
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    similarities = (queries / np.where(norms > 0, norms, 1)) @ matrix.T
+    
+    # First row wins on ties, same as the per-identity loop in database order
+    best_rows = similarities.argmax(axis=1)
+    best_similarities = similarities[np.arange(len(queries)), best_rows]
+    
+    matches = []
+    for row, similarity in zip(best_rows, best_similarities):
+        if similarity > threshold and similarity > 0.0:
+            matches.append((names[owners[row]], float(similarity)))
+        else:
+            matches.append((None, 0.0))
+    return matches
+
+def _recognition_result(name: Optional[str], similarity: float) -> Dict[str, Any]:
+    """Build a recognition result dictionary, name None means unknown"""
+    identity = face_database.get(name, {}) if name is not None else {}
+    best_match_name = name if name is not None else "Unknown"
+    logger.debug(f"Recognized: {best_match_name} with similarity {similarity:.4f}")
+    return {
+        'name': best_match_name,
+        'similarity': similarity,
+        'is_known': name is not None,
+        'role': identity.get('role', ''),
+        'access': identity.get('access', {})
+    }
+
 def recognize_face(face_embedding: np.ndarray, threshold: float = RECOGNITION_THRESHOLD) -> Dict[str, Any]:
     """Recognize a face using cosine similarity
     
@@ -550,6 +682,11 @@ def recognize_face(face_embedding: np.ndarray, threshold: float = RECOGNITION_TH
             'access': {}
         }
     
+    # Fast path: one product against the cached matrix of all known embeddings
+    matches = _match_embedding_index(np.atleast_2d(face_embedding), threshold)
+    if matches is not None:
+        return _recognition_result(*matches[0])
+    
     max_similarity = 0.0
     best_match_name = "Unknown"
     access_permissions = {}
@@ -609,31 +746,118 @@ def recognize_face(face_embedding: np.ndarray, threshold: float = RECOGNITION_TH
         'access': access_permissions
     }
 
-def process_face_image(image_path: str) -> Dict:
+def recognize_faces_batch(face_embeddings: np.ndarray, threshold: float = RECOGNITION_THRESHOLD) -> List[Dict[str, Any]]:
+    """Recognize several faces at once using cosine similarity
+    
+    Compares all faces against each identity with a single matrix product instead
+    of calling recognize_face once per face.
+    
+    Args:
+        face_embeddings: (M, D) matrix with one face embedding per row
+        threshold: Similarity threshold (higher = more strict)
+        
+    Returns:
+        List with one recognition result per row, in the same format as recognize_face
+    """
+    face_embeddings = np.atleast_2d(np.asarray(face_embeddings))
+    num_faces = face_embeddings.shape[0]
+    
+    if not face_database:
+        logger.warning("Face database is empty")
+        return [{
+            'name': "Unknown",
+            'similarity': 0.0,
+            'is_known': False,
+            'role': '',
+            'access': {}
+        } for _ in range(num_faces)]
+    
+    # Fast path: one product against the cached matrix of all known embeddings
+    matches = _match_embedding_index(face_embeddings, threshold)
+    if matches is not None:
+        return [_recognition_result(name, similarity) for name, similarity in matches]
+    
+    input_dim = face_embeddings.shape[1]
+    names = list(face_database.keys())
+    max_similarity = np.zeros(num_faces)
+    best_match = np.full(num_faces, -1)
+    
+    for idx, name in enumerate(names):
+        embeddings = face_database[name]['embeddings']
+        if len(embeddings) == 0:
+            continue
+        
+        try:
+            db_matrix = np.stack(embeddings)
+            db_dim = db_matrix.shape[1]
+            
+            # Truncate or zero-pad the inputs to the database dimension (same as recognize_face)
+            if db_dim != input_dim:
+                logger.info(f"Dimension mismatch: input={input_dim}, database={db_dim}")
+                compare_embeddings = np.zeros((num_faces, db_dim))
+                keep = min(input_dim, db_dim)
+                compare_embeddings[:, :keep] = face_embeddings[:, :keep]
+            else:
+                compare_embeddings = face_embeddings
+            
+            # (M, N) similarities in one product, best match per face for this person
+            best_similarity = cosine_similarity(compare_embeddings, db_matrix).max(axis=1)
+            
+            # Update best matches that are above threshold
+            better = (best_similarity > max_similarity) & (best_similarity > threshold)
+            max_similarity[better] = best_similarity[better]
+            best_match[better] = idx
+        except Exception as e:
+            logger.error(f"Error calculating similarity for {name}: {e}")
+            continue
+    
+    results = []
+    for similarity, idx in zip(max_similarity, best_match):
+        identity = face_database[names[idx]] if idx >= 0 else {}
+        best_match_name = names[idx] if idx >= 0 else "Unknown"
+        logger.debug(f"Recognized: {best_match_name} with similarity {similarity:.4f}")
+        results.append({
+            'name': best_match_name,
+            'similarity': float(similarity),
+            'is_known': best_match_name != "Unknown",
+            'role': identity.get('role', ''),
+            'access': identity.get('access', {})
+        })
+    
+    return results
+
+def process_face_image(image_path: str, return_faces: bool = False) -> Union[Dict, Tuple[Dict, List[Dict]]]:
     """Process a face image and return recognition results
     
     Args:
         image_path: Path to the image file
+        return_faces: Also return the detected faces so callers don't re-run detection
         
     Returns:
-        Dictionary with recognition results and face data
+        Dictionary with recognition results and face data, or a
+        (result, faces) tuple if return_faces is True
     """
+    faces = []
+    
+    def _result(result: Dict) -> Union[Dict, Tuple[Dict, List[Dict]]]:
+        return (result, faces) if return_faces else result
+    
     try:
         # Initialize if needed
         if insightface_model is None:
             if not init_face_recognition():
-                return {
+                return _result({
                     'success': False,
                     'error': 'Failed to initialize face recognition'
-                }
+                })
         
         # Load image
         image = cv2.imread(image_path)
         if image is None:
-            return {
+            return _result({
                 'success': False,
                 'error': f'Could not load image: {image_path}'
-            }
+            })
         
         # Log image info
         logger.info(f"Image shape: {image.shape}")
@@ -697,10 +921,10 @@ def process_face_image(image_path: str) -> Dict:
             logger.info(f"Total faces detected: {len(mediapipe_faces)}")
             
             if not mediapipe_faces:
-                return {
+                return _result({
                     'success': False,
                     'error': 'No face detected in the image'
-                }
+                })
             
             # Use the largest face (usually the main subject in enrollment images)
             best_face = max(mediapipe_faces, key=lambda f: 
@@ -726,6 +950,11 @@ def process_face_image(image_path: str) -> Dict:
             # Perform recognition on the aligned face embedding
             recognition_result = recognize_face(embedding)
             
+            # Keep track of original image path for callers that reuse the faces
+            for face in mediapipe_faces:
+                face['image_path'] = image_path
+            faces.extend(mediapipe_faces)
+            
             # Create result
             result = {
                 'success': True,
@@ -736,17 +965,17 @@ def process_face_image(image_path: str) -> Dict:
                 'debug_aligned_image': debug_aligned_path
             }
             
-            return result
+            return _result(result)
         finally:
             # Restore stdout
             sys.stdout = old_stdout
             
     except Exception as e:
         logger.error(f"Error processing face image: {e}")
-        return {
+        return _result({
             'success': False,
             'error': str(e)
-        }
+        })
 
 def encode_face_for_json(face_embedding: np.ndarray) -> str:
     """Convert face embedding to JSON-compatible string
@@ -809,6 +1038,7 @@ def delete_identity(name: str) -> bool:
             return False
         
         del face_database[name]
+        invalidate_embedding_index()
         
         # Save database
         with open(FACE_DB_FILE, 'wb') as f:
@@ -867,16 +1097,20 @@ if __name__ == "__main__":
     import sys
     
     if len(sys.argv) < 2:
-        print("Usage: python mediapipe_face.py <image_path>")
+        print("Usage: python mediapipe_face.py <image_path> [--show]")
         sys.exit(1)
     
     image_path = sys.argv[1]
+    show = '--show' in sys.argv[2:]
     result = process_face_image(image_path)
     
-    if result['success']:
-        # Print compact result for command line use
-        print(json.dumps(result))
-        
+    # Print compact result for command line use
+    print(json.dumps(result))
+    
+    if not result['success']:
+        sys.exit(1)
+    
+    if show:
         # Display image with detected faces
         image = cv2.imread(image_path)
         faces = extract_faces_from_image(image_path)
@@ -893,6 +1127,3 @@ if __name__ == "__main__":
         cv2.imshow("Detected Faces", image_with_faces)
         cv2.waitKey(0)
         cv2.destroyAllWindows()
-    else:
-        print(json.dumps(result))
-        sys.exit(1) 
\ No newline at end of file
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Motion Detection Module
+Frame-difference motion scoring used to pick which video frames get face detection
+"""
+
+import cv2
+import numpy as np
+from typing import Optional
+
+# Optional Numba JIT for the fused motion-score kernel
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+MOTION_PIXEL_THRESHOLD = 25  # Gray-level difference for a pixel to count as changed
+
+MOTION_SAMPLE_SIZE = 512  # Pixels checked by the quick pre-test before a full motion pass
+
+# Run the motion path through OpenCV's T-API (cv2.UMat) when an OpenCL device is available
+HAS_OPENCL = cv2.ocl.haveOpenCL()
+
+if HAS_NUMBA:
+    @njit(nogil=True, cache=True, parallel=True, fastmath=True)
+    def _motion_ratio_kernel(cur: np.ndarray, prev: np.ndarray, thr: int) -> float:
+        """Single pass absdiff + threshold + count over two grayscale frames, rows split across cores"""
+        h, w = cur.shape
+        count = 0
+        for i in prange(h):
+            row_count = 0
+            for j in range(w):
+                a = cur[i, j]
+                b = prev[i, j]
+                d = a - b if a > b else b - a
+                if d > thr:
+                    row_count += 1
+            count += row_count
+        return count / (h * w)
+
+def warm_up_motion_kernel():
+    """Compile (or load from the on-disk cache) the motion kernel before the first real frame"""
+    if HAS_NUMBA:
+        frame = np.zeros((2, 2), dtype=np.uint8)
+        _motion_ratio_kernel(frame, frame, MOTION_PIXEL_THRESHOLD)
+
+def motion_sample_indices(num_pixels: int, sample_size: int = MOTION_SAMPLE_SIZE,
+                          seed: Optional[int] = None) -> np.ndarray:
+    """
+    Random flat pixel indices for the sampled motion pre-test
+    
+    Args:
+        num_pixels: Number of pixels in the motion frames
+        sample_size: Number of pixels to sample
+        seed: Optional seed for reproducible sampling
+        
+    Returns:
+        Array of flat indices into the frame
+    """
+    return np.random.default_rng(seed).integers(0, num_pixels, size=sample_size)
+
+def motion_ratio(cur: np.ndarray, prev: np.ndarray, thr: int = MOTION_PIXEL_THRESHOLD,
+                 sample_idx: Optional[np.ndarray] = None, min_ratio: float = 0.0) -> float:
+    """
+    Fraction of pixels whose absolute difference between two frames exceeds a threshold
+    
+    Args:
+        cur: Current grayscale frame (uint8 array or cv2.UMat)
+        prev: Previous grayscale frame with the same shape and type
+        thr: Gray-level difference above which a pixel counts as changed
+        sample_idx: Flat pixel indices for a quick pre-test (ignored for cv2.UMat frames)
+        min_ratio: If the sampled ratio is below this, return 0 without the full pass
+        
+    Returns:
+        Ratio of changed pixels in [0, 1]
+    """
+    if isinstance(cur, cv2.UMat):
+        # Keep the work on the OpenCL device, only the scalar mean is read back
+        frame_diff = cv2.absdiff(cur, prev)
+        cv2.threshold(frame_diff, thr, 255, cv2.THRESH_BINARY, dst=frame_diff)
+        return cv2.mean(frame_diff)[0] / 255
+    
+    if sample_idx is not None:
+        # Static scenes are settled from a few hundred pixels instead of the whole frame
+        sample_diff = np.abs(np.take(cur, sample_idx).astype(np.int16) - np.take(prev, sample_idx))
+        if np.count_nonzero(sample_diff > thr) < min_ratio * len(sample_idx):
+            return 0.0
+    
+    if HAS_NUMBA:
+        return _motion_ratio_kernel(np.ascontiguousarray(cur), np.ascontiguousarray(prev), thr)
+    
+    # Fallback: absdiff -> threshold -> count, thresholding in place over the difference image
+    frame_diff = cv2.absdiff(cur, prev)
+    cv2.threshold(frame_diff, thr, 255, cv2.THRESH_BINARY, dst=frame_diff)
+    return cv2.countNonZero(frame_diff) / frame_diff.size
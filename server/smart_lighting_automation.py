@@ -13,7 +13,7 @@ import logging
 import os
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, Optional, List, Any
+from typing import Callable, Dict, NamedTuple, Optional, List, Any
 import mysql.connector
 
 # Import our detection modules
@@ -28,14 +28,25 @@ except ImportError as e:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class RoomState(NamedTuple):
+    """Lighting state of a single room, cheap enough to poll on every frame"""
+    person_present: bool
+    lights_on: bool
+    has_pending_notification: bool
+
 class SmartLightingController:
-    def __init__(self, config: Optional[Dict[str, Any]] = None):
+    def __init__(self, config: Optional[Dict[str, Any]] = None,
+                 time_source: Callable[[], float] = time.time):
         """
         Initialize the smart lighting controller
         
         Args:
             config: Configuration dictionary with optional settings
+            time_source: Clock returning the current time in seconds, tests can pass
+                a fake clock to advance time without sleeping
         """
+        self.time_source = time_source
+        
         # Default configuration
         default_config = {
             'test_mode': False,
@@ -77,6 +88,35 @@ class SmartLightingController:
         
         logger.info("Smart lighting controller initialized with config: %s", self.config)
     
+    def reset_state(self, camera_id: Optional[str] = None):
+        """
+        Clear lighting state tracking without reloading the detection models
+        
+        The notification and auto turn-off state is shared by all cameras, so it is
+        reset (and a scheduled auto turn-off cancelled) whichever camera is reset.
+        
+        Args:
+            camera_id: Camera to reset, or None to reset all cameras
+        """
+        timer = self.current_lighting_state.get('auto_turn_off_scheduled')
+        if timer:
+            timer.cancel()
+        
+        state_dicts = (self.current_lighting_state, self.last_state_change,
+                       self.state_confidence, self.last_motion_time)
+        for state in state_dicts:
+            if camera_id is None:
+                state.clear()
+            else:
+                state.pop(camera_id, None)
+        
+        self.current_lighting_state.update({
+            'pending_notification': None,
+            'lights_on': False,
+            'last_person_time': None,
+            'auto_turn_off_scheduled': None
+        })
+    
     def detect_person_in_frame(self, frame: np.ndarray) -> bool:
         """
         Detect if a person is present in the frame
@@ -92,15 +132,8 @@ class SmartLightingController:
             if self.yolo_model:
                 results = self.yolo_model(frame)
                 for result in results:
-                    boxes = result.boxes
-                    for box in boxes:
-                        class_id = int(box.cls[0])
-                        class_name = self.yolo_model.names[class_id]
-                        confidence = float(box.conf[0])
-                        
-                        if (class_name == 'person' and 
-                            confidence > self.config['person_confidence_threshold']):
-                            return True
+                    if self._result_has_person(result):
+                        return True
             
             # Method 2: Face detection as backup
             faces = detect_faces(frame)
@@ -113,6 +146,47 @@ class SmartLightingController:
             logger.error(f"Error in person detection: {e}")
             return False
     
+    def _result_has_person(self, result) -> bool:
+        """Check a single YOLO result for a person above the confidence threshold"""
+        for box in result.boxes:
+            class_id = int(box.cls[0])
+            class_name = self.yolo_model.names[class_id]
+            confidence = float(box.conf[0])
+            
+            if (class_name == 'person' and 
+                confidence > self.config['person_confidence_threshold']):
+                return True
+        return False
+    
+    def detect_persons_in_frames(self, frames: List[np.ndarray]) -> List[bool]:
+        """
+        Detect persons in a batch of frames with a single YOLO call
+        
+        Args:
+            frames: List of input frames
+            
+        Returns:
+            List with True for each frame where a person was detected
+        """
+        detected = [False] * len(frames)
+        
+        try:
+            # Method 1: YOLO detection, one batched inference for all frames
+            if self.yolo_model and frames:
+                results = self.yolo_model(frames)
+                for i, result in enumerate(results):
+                    detected[i] = self._result_has_person(result)
+            
+            # Method 2: Face detection as backup for frames without a person
+            for i, frame in enumerate(frames):
+                if not detected[i] and detect_faces(frame):
+                    detected[i] = True
+                    
+        except Exception as e:
+            logger.error(f"Error in batched person detection: {e}")
+        
+        return detected
+    
     def get_light_status(self, frame: np.ndarray) -> Dict:
         """
         Get current light status
@@ -188,7 +262,7 @@ class SmartLightingController:
             Notification ID for tracking response
         """
         try:
-            notification_id = f"{int(time.time())}"
+            notification_id = f"{int(self.time_source())}"
             
             payload = {
                 'id': notification_id,
@@ -308,32 +382,67 @@ class SmartLightingController:
         except Exception as e:
             logger.error(f"Error logging automation action: {e}")
     
-    def process_frame(self, frame: np.ndarray, camera_id: str = 'default'):
+    def process_frame(self, frame: np.ndarray, camera_id: str = 'default') -> Dict:
         """
         Process a frame for smart lighting control based on person detection
         
         Args:
             frame: Input frame from camera
             camera_id: Identifier for the camera
+            
+        Returns:
+            Dictionary with the person detection and light status for the frame
+        """
+        return self._process_detection(frame, camera_id, self.detect_person_in_frame(frame))
+    
+    def process_frames_batch(self, frames: List[np.ndarray], camera_id: str = 'default') -> List[Dict]:
+        """
+        Process a batch of frames, running person detection once for the whole batch
+        
+        Args:
+            frames: Input frames from camera, in capture order
+            camera_id: Identifier for the camera
+            
+        Returns:
+            List with the person detection and light status for each frame
+        """
+        persons_detected = self.detect_persons_in_frames(frames)
+        return [self._process_detection(frame, camera_id, person_detected)
+                for frame, person_detected in zip(frames, persons_detected)]
+    
+    def _process_detection(self, frame: np.ndarray, camera_id: str, person_detected: bool) -> Dict:
+        """Update lighting state for a frame given its person detection result"""
+        return self.process_detection_result(person_detected, self.get_light_status(frame), camera_id)
+    
+    def process_detection_result(self, person_detected: bool, light_status: Dict,
+                                 camera_id: str = 'default') -> Dict:
+        """
+        Update lighting state from an already computed detection result
+        
+        Lets callers replay the result for an unchanged scene as time passes
+        without running person and light detection again.
+        
+        Args:
+            person_detected: Whether a person is present
+            light_status: Light status as returned by get_light_status
+            camera_id: Identifier for the camera
+            
+        Returns:
+            Dictionary with the person detection and light status
         """
         try:
-            # Get current light status
-            light_status = self.get_light_status(frame)
             current_state = light_status['status']
             
             # Initialize state tracking for this camera if not exists
             if camera_id not in self.current_lighting_state:
                 self.current_lighting_state[camera_id] = current_state
-                self.last_state_change[camera_id] = time.time()
+                self.last_state_change[camera_id] = self.time_source()
                 self.state_confidence[camera_id] = light_status['confidence']
                 self.last_motion_time[camera_id] = 0
             
-            # Check for person in frame
-            person_detected = self.detect_person_in_frame(frame)
-            
             # Update last detection time if person detected
             if person_detected:
-                self.last_motion_time[camera_id] = time.time()
+                self.last_motion_time[camera_id] = self.time_source()
                 logger.info(f"Person detected for camera {camera_id}")
                 
                 # If lights are off and person detected, turn them on
@@ -341,16 +450,16 @@ class SmartLightingController:
                     logger.info("Person detected with lights off - turning lights on")
                     self.esp_light_control('on')
                     self.current_lighting_state[camera_id] = 'on'
-                    self.last_state_change[camera_id] = time.time()
+                    self.last_state_change[camera_id] = self.time_source()
             
             # Check if we should turn off lights due to no person detected
             elif current_state == 'on':
-                time_since_person = time.time() - self.last_motion_time[camera_id]
+                time_since_person = self.time_source() - self.last_motion_time[camera_id]
                 if time_since_person > self.config['person_timeout']:
                     logger.info(f"No person detected for {time_since_person:.1f}s - turning lights off")
                     self.esp_light_control('off')
                     self.current_lighting_state[camera_id] = 'off'
-                    self.last_state_change[camera_id] = time.time()
+                    self.last_state_change[camera_id] = self.time_source()
             
             # Log state changes
             if current_state != self.current_lighting_state[camera_id]:
@@ -361,6 +470,28 @@ class SmartLightingController:
             
         except Exception as e:
             logger.error(f"Error in frame processing: {e}")
+        
+        return {
+            'person_detected': person_detected,
+            'light_status': light_status
+        }
+    
+    def get_room_state(self, camera_id: str = 'default') -> RoomState:
+        """
+        Get the lighting state for one camera without building the full status summary
+        
+        Args:
+            camera_id: Identifier for the camera
+            
+        Returns:
+            RoomState with person presence, light state and pending notification flag
+        """
+        last_motion = self.last_motion_time.get(camera_id, 0)
+        return RoomState(
+            person_present=bool(last_motion) and self.time_source() - last_motion <= self.config['person_timeout'],
+            lights_on=self.current_lighting_state.get(camera_id) == 'on',
+            has_pending_notification=bool(self.current_lighting_state.get('pending_notification'))
+        )
     
     def get_status_summary(self) -> Dict:
         """Get current status summary"""
@@ -19,6 +19,9 @@ from mediapipe_face import (
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Random generator for synthetic test embeddings
+_rng = np.random.default_rng()
+
 def test_embedding_dimensions():
     """Test if the embedding dimension handling is working correctly"""
     print("Testing embedding dimension handling...")
@@ -63,7 +66,7 @@ def test_embedding_dimensions():
             # Skip if it's the same size
             continue
             
-        test_embedding = np.random.random(size)
+        test_embedding = _rng.random(size)
         print(f"\nTesting with embedding size: {size}")
         
         # Register a test face with this embedding
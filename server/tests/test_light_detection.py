@@ -4,8 +4,10 @@ Test script for light detection functionality
 """
 
 import cv2
+import numpy as np
 import sys
 import os
+from collections import deque
 from datetime import datetime
 import logging
 
@@ -13,6 +15,7 @@ import logging
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from light_detection import LightDetector, create_light_detector_config, detect_light_state_simple
+from frame_reader import ThreadedFrameReader
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -44,23 +47,61 @@ def test_light_detection_on_video(video_path, camera_role='test_room'):
     print(f"   - Camera Role: {camera_role}")
     print()
     
-    frame_number = 0
-    lighting_events = []
+    lighting_events = deque()
+    event_lines = []
     
     # Process frames (sample every 30 frames for speed)
     sample_interval = 30
     
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Only process every Nth frame for speed
-        if frame_number % sample_interval == 0:
+    # Scratch buffers for the downsampled frame, allocated once and reused
+    small_bgr = None
+    small_gray = None
+    analysis_width = light_detector.config['analysis_width']
+    
+    # Skip full analysis while the mean brightness is unchanged and the state is settled
+    mean_delta_threshold = 5.0
+    max_skipped_samples = 60
+    last_mean = None
+    samples_since_analysis = 0
+    skipped_samples = 0
+    
+    # Decode frames on a background thread while this thread analyzes them
+    with ThreadedFrameReader(cap, sample_interval=sample_interval) as reader:
+        for frame_number, frame in reader:
             timestamp = datetime.now()
             
+            # Progress indicator
+            if frame_number and frame_number % (sample_interval * 10) == 0:
+                progress = frame_number / frame_count * 100
+                print(f"📊 Progress: {progress:.1f}% (frame {frame_number}/{frame_count})")
+            
+            if small_gray is None:
+                height, width = frame.shape[:2]
+                small_width = min(width, analysis_width)
+                small_height = int(height * (small_width / width))
+                small_bgr = np.empty((small_height, small_width, 3), np.uint8)
+                small_gray = np.empty((small_height, small_width), np.uint8)
+            
+            # Downsample and convert to grayscale into the reused buffers
+            cv2.resize(frame, (small_gray.shape[1], small_gray.shape[0]), dst=small_bgr,
+                       interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(small_bgr, cv2.COLOR_BGR2GRAY, dst=small_gray)
+            
+            # Cheap mean-brightness check before the full histogram analysis
+            mean_brightness = cv2.mean(small_gray)[0]
+            state_settled = (light_detector.current_state is not None and
+                             light_detector.frames_in_current_state == 0)
+            if (state_settled and last_mean is not None and
+                    abs(mean_brightness - last_mean) <= mean_delta_threshold and
+                    samples_since_analysis < max_skipped_samples):
+                samples_since_analysis += 1
+                skipped_samples += 1
+                continue
+            last_mean = mean_brightness
+            samples_since_analysis = 0
+            
             # Analyze frame for lighting
-            results = light_detector.analyze_frame(frame, timestamp)
+            results = light_detector.analyze_frame(frame, timestamp, gray=small_gray)
             
             # Check for state changes
             if results.get('state_changed', False):
@@ -74,26 +115,24 @@ def test_light_detection_on_video(video_path, camera_role='test_room'):
                 }
                 lighting_events.append(event)
                 
-                # Print event
+                # Buffer event output, written in one batch after the loop
                 time_str = f"{int(event['time']/60):02d}:{int(event['time']%60):02d}"
-                print(f"💡 Frame {frame_number:5d} ({time_str}): "
-                      f"Lights {event['previous_state']} → {event['new_state']} "
-                      f"(confidence: {event['confidence']:.2f}, "
-                      f"brightness: {event['brightness']:.1f})")
-        
-        frame_number += 1
-        
-        # Progress indicator
-        if frame_number % (sample_interval * 10) == 0:
-            progress = frame_number / frame_count * 100
-            print(f"📊 Progress: {progress:.1f}% (frame {frame_number}/{frame_count})")
+                event_lines.append(f"💡 Frame {frame_number:5d} ({time_str}): "
+                                   f"Lights {event['previous_state']} → {event['new_state']} "
+                                   f"(confidence: {event['confidence']:.2f}, "
+                                   f"brightness: {event['brightness']:.1f})")
     
     cap.release()
     
+    lighting_events = list(lighting_events)
+    if event_lines:
+        sys.stdout.write("\n".join(event_lines) + "\n")
+    
     # Summary
     print("\n📋 Detection Summary:")
     print(f"   - Total lighting events detected: {len(lighting_events)}")
     print(f"   - Final lighting state: {light_detector.current_state}")
+    print(f"   - Samples skipped (unchanged brightness): {skipped_samples}")
     
     if lighting_events:
         print("\n🗂️  All Lighting Events:")
@@ -116,8 +155,11 @@ def test_light_detection_on_image(image_path):
         print(f"❌ Error: Could not load image: {image_path}")
         return
     
+    # Convert to grayscale once and reuse for both detectors
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    
     # Simple detection
-    state, brightness = detect_light_state_simple(image)
+    state, brightness = detect_light_state_simple(gray)
     print(f"🔍 Simple Detection Result:")
     print(f"   - Lighting State: {state}")
     print(f"   - Brightness Level: {brightness:.1f}")
@@ -125,7 +167,7 @@ def test_light_detection_on_image(image_path):
     # Advanced detection
     config = create_light_detector_config()
     detector = LightDetector(config)
-    results = detector.analyze_frame(image)
+    results = detector.analyze_frame(image, gray=gray)
     
     print(f"\n🔬 Advanced Detection Result:")
     print(f"   - Lighting State: {results.get('lighting_state', 'unknown')}")
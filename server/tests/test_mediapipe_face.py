@@ -16,12 +16,13 @@ from mediapipe_face import (
     recognize_face,
     draw_faces
 )
+from image_io import JPEG_PARAMS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def test_detection(image_path):
+def test_detection(image_path, show=False):
     """Test face detection on an image"""
     print(f"Testing face detection on {image_path}")
     
@@ -32,7 +33,7 @@ def test_detection(image_path):
         return False
     
     # Extract faces
-    faces = extract_faces_from_image(image_path)
+    faces = extract_faces_from_image(image_path, image)
     
     if not faces:
         print("No faces detected!")
@@ -50,13 +51,14 @@ def test_detection(image_path):
     
     # Save result
     output_path = os.path.join(os.path.dirname(image_path), f"detected_{os.path.basename(image_path)}")
-    cv2.imwrite(output_path, image_with_faces)
+    cv2.imwrite(output_path, image_with_faces, JPEG_PARAMS)
     print(f"Saved result to {output_path}")
     
-    # Show result
-    cv2.imshow("Detected Faces", image_with_faces)
-    cv2.waitKey(0)
-    cv2.destroyAllWindows()
+    # Show result (blocks until a key is pressed, so only on request)
+    if show:
+        cv2.imshow("Detected Faces", image_with_faces)
+        cv2.waitKey(0)
+        cv2.destroyAllWindows()
     
     return True
 
@@ -64,16 +66,13 @@ def register_face(image_path, name, role="Unknown"):
     """Register a face in the database"""
     print(f"Registering face for {name} ({role}) from {image_path}")
     
-    # Process face image
-    result = process_face_image(image_path)
+    # Process face image, reusing its detected faces instead of running detection again
+    result, faces = process_face_image(image_path, return_faces=True)
     
     if not result['success']:
         print(f"Error: {result['error']}")
         return False
     
-    # Extract faces
-    faces = extract_faces_from_image(image_path)
-    
     if not faces:
         print("No faces detected!")
         return False
@@ -95,7 +94,7 @@ def register_face(image_path, name, role="Unknown"):
     
     return success
 
-def test_recognition(image_path):
+def test_recognition(image_path, show=False):
     """Test recognition on an image"""
     print(f"Testing face recognition on {image_path}")
     
@@ -106,7 +105,7 @@ def test_recognition(image_path):
         return False
     
     # Extract faces
-    faces = extract_faces_from_image(image_path)
+    faces = extract_faces_from_image(image_path, image)
     
     if not faces:
         print("No faces detected!")
@@ -127,13 +126,14 @@ def test_recognition(image_path):
     
     # Save result
     output_path = os.path.join(os.path.dirname(image_path), f"recognized_{os.path.basename(image_path)}")
-    cv2.imwrite(output_path, image_with_faces)
+    cv2.imwrite(output_path, image_with_faces, JPEG_PARAMS)
     print(f"Saved result to {output_path}")
     
-    # Show result
-    cv2.imshow("Face Recognition", image_with_faces)
-    cv2.waitKey(0)
-    cv2.destroyAllWindows()
+    # Show result (blocks until a key is pressed, so only on request)
+    if show:
+        cv2.imshow("Face Recognition", image_with_faces)
+        cv2.waitKey(0)
+        cv2.destroyAllWindows()
     
     return True
 
@@ -144,6 +144,7 @@ if __name__ == "__main__":
     parser.add_argument('--name', type=str, help='Name for face registration')
     parser.add_argument('--role', type=str, default='Unknown', help='Role for face registration')
     parser.add_argument('--recognize', type=str, help='Test recognition on an image')
+    parser.add_argument('--show', action='store_true', help='Display result images in a window')
     
     args = parser.parse_args()
     
@@ -153,10 +154,10 @@ if __name__ == "__main__":
         sys.exit(1)
     
     if args.detect:
-        test_detection(args.detect)
+        test_detection(args.detect, show=args.show)
     elif args.register and args.name:
         register_face(args.register, args.name, args.role)
     elif args.recognize:
-        test_recognition(args.recognize)
+        test_recognition(args.recognize, show=args.show)
     else:
         parser.print_help() 
\ No newline at end of file
@@ -7,21 +7,73 @@ where folder names represent person names.
 import os
 import sys
 import cv2
-import glob
 import json
 import logging
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from mediapipe_face import (
     init_face_recognition,
     extract_faces_from_image,
     recognize_face,
     draw_faces
 )
+from image_io import JPEG_PARAMS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Number of threads used to read and decode images concurrently
+DECODE_WORKERS = 8
+
+# Maximum number of images read and decoded ahead of the one being processed
+DECODE_WINDOW = 2 * DECODE_WORKERS
+
+def list_jpg_files(directory_path):
+    """List jpg files in a directory using os.scandir (no extra stat per entry)"""
+    with os.scandir(directory_path) as entries:
+        return sorted(entry.path for entry in entries
+                      if entry.name.endswith('.jpg') and not entry.name.startswith('.') and entry.is_file())
+
+def load_and_decode(image_path):
+    """Read an image file into memory and decode it (cv2.imdecode releases the GIL)"""
+    try:
+        with open(image_path, 'rb') as f:
+            buf = f.read()
+    except OSError as e:
+        logger.error(f"Error reading image {image_path}: {e}")
+        return None
+    
+    if not buf:
+        return None
+    
+    return cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR)
+
+def decode_images(image_paths):
+    """
+    Read and decode images on background threads, yielding them in order
+    
+    Only DECODE_WINDOW images are in flight at a time, so decoding overlaps the
+    caller's processing while memory stays bounded for large directories.
+    
+    Args:
+        image_paths: Image file paths
+        
+    Returns:
+        Iterator over (image_path, image) tuples, image is None if it could not be loaded
+    """
+    with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as executor:
+        in_flight = deque()
+        for image_path in image_paths:
+            in_flight.append((image_path, executor.submit(load_and_decode, image_path)))
+            if len(in_flight) >= DECODE_WINDOW:
+                path, future = in_flight.popleft()
+                yield path, future.result()
+        while in_flight:
+            path, future = in_flight.popleft()
+            yield path, future.result()
+
 def get_bbox_coordinates(bbox):
     """Helper function to handle different bbox formats"""
     if isinstance(bbox, (tuple, list)) and len(bbox) == 4:
@@ -45,7 +97,7 @@ def test_face_detection_in_directory(directory_path, person_name):
     print(f"Testing face detection for {person_name} in {directory_path}")
     
     # Get all jpg files in the directory
-    image_files = glob.glob(os.path.join(directory_path, "*.jpg"))
+    image_files = list_jpg_files(directory_path)
     
     if not image_files:
         print(f"No jpg images found in {directory_path}")
@@ -56,19 +108,18 @@ def test_face_detection_in_directory(directory_path, person_name):
     success_count = 0
     failure_count = 0
     
-    # Process each image
-    for image_path in image_files:
+    # Process each image as it is decoded, the next ones are read and decoded in background threads
+    for image_path, image in decode_images(image_files):
         print(f"\nProcessing {os.path.basename(image_path)}")
         
-        # Load image
-        image = cv2.imread(image_path)
+        # Check decoded image
         if image is None:
             print(f"Error: Could not load image {image_path}")
             failure_count += 1
             continue
         
         # Extract faces
-        faces = extract_faces_from_image(image_path)
+        faces = extract_faces_from_image(image_path, image)
         
         if not faces:
             print("No faces detected!")
@@ -94,7 +145,7 @@ def test_face_detection_in_directory(directory_path, person_name):
         
         # Save result
         output_path = os.path.join(os.path.dirname(image_path), f"detected_{os.path.basename(image_path)}")
-        cv2.imwrite(output_path, image_with_faces)
+        cv2.imwrite(output_path, image_with_faces, JPEG_PARAMS)
         print(f"Saved result to {output_path}")
         
     print(f"\nResults for {person_name}:")
@@ -108,7 +159,7 @@ def test_face_recognition_in_directory(directory_path, person_name):
     print(f"\nTesting face recognition for {person_name} in {directory_path}")
     
     # Get all jpg files in the directory
-    image_files = glob.glob(os.path.join(directory_path, "*.jpg"))
+    image_files = list_jpg_files(directory_path)
     
     if not image_files:
         print(f"No jpg images found in {directory_path}")
@@ -119,19 +170,18 @@ def test_face_recognition_in_directory(directory_path, person_name):
     success_count = 0
     failure_count = 0
     
-    # Process each image
-    for image_path in image_files:
+    # Process each image as it is decoded, the next ones are read and decoded in background threads
+    for image_path, image in decode_images(image_files):
         print(f"\nProcessing {os.path.basename(image_path)}")
         
-        # Load image
-        image = cv2.imread(image_path)
+        # Check decoded image
         if image is None:
             print(f"Error: Could not load image {image_path}")
             failure_count += 1
             continue
         
         # Extract faces
-        faces = extract_faces_from_image(image_path)
+        faces = extract_faces_from_image(image_path, image)
         
         if not faces:
             print("No faces detected!")
@@ -171,7 +221,7 @@ def test_face_recognition_in_directory(directory_path, person_name):
                 
                 # Save result
                 output_path = os.path.join(os.path.dirname(image_path), f"recognized_{os.path.basename(image_path)}")
-                cv2.imwrite(output_path, image_with_faces)
+                cv2.imwrite(output_path, image_with_faces, JPEG_PARAMS)
                 print(f"Saved recognition result to {output_path}")
                 
                 if name == person_name:
@@ -204,18 +254,19 @@ def main():
         return
     
     # Get all person directories
-    person_dirs = [d for d in os.listdir(temp_dir) if os.path.isdir(os.path.join(temp_dir, d))]
+    with os.scandir(temp_dir) as entries:
+        person_dirs = [entry for entry in entries if entry.is_dir()]
     
     if not person_dirs:
         print(f"No person directories found in {temp_dir}")
         return
     
-    print(f"Found {len(person_dirs)} person directories: {', '.join(person_dirs)}")
+    print(f"Found {len(person_dirs)} person directories: {', '.join(entry.name for entry in person_dirs)}")
     
     # Test each person directory
     for person_dir in person_dirs:
-        person_name = person_dir  # Directory name is the person name
-        person_path = os.path.join(temp_dir, person_dir)
+        person_name = person_dir.name  # Directory name is the person name
+        person_path = person_dir.path
         
         # Test face detection
         test_face_detection_in_directory(person_path, person_name)
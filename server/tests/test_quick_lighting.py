@@ -45,7 +45,10 @@ def quick_test_lighting():
         print("❌ Could not open video")
         return
     
-    start_time = datetime.now()
+    # Keep the capture buffer to a single frame so reads reflect the current frame
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    
+    start_time = time.monotonic()
     frame_count = 0
     notification_sent = False
     
@@ -69,7 +72,7 @@ def quick_test_lighting():
         room_state = controller.room_states['living_room']
         
         # Calculate elapsed time
-        elapsed_time = (datetime.now() - start_time).total_seconds()
+        elapsed_time = time.monotonic() - start_time
         
         # Check if lights first detected
         if room_state.get('lights_first_detected_time') and not notification_sent:
@@ -7,12 +7,15 @@ import sys
 import cv2
 import logging
 import pickle
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from mediapipe_face import (
     init_face_recognition,
-    extract_faces_from_image,
-    recognize_face,
+    extract_faces_from_numpy,
+    recognize_faces_batch,
     draw_faces
 )
+from image_io import check_writes, write_jpeg
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,16 +31,32 @@ def verify_database_embeddings():
         print(f"Database contains {len(db)} faces:")
         for name, data in db.items():
             embeddings = data['embeddings']
-            shapes = [e.shape for e in embeddings]
-            print(f"- {name}: {len(embeddings)} embeddings with shapes {shapes}")
+            dims = {e.shape[-1] for e in embeddings}
+            if len(dims) == 1:
+                # Consistent dimensions, stack into a single (N, dim) matrix
+                arr = np.stack(embeddings)
+                print(f"- {name}: {arr.shape[0]} embeddings, dim {arr.shape[1]}")
+            else:
+                print(f"- {name}: {len(embeddings)} embeddings with mismatched dims {sorted(dims)}")
         
         return True
     except Exception as e:
         print(f"Error checking database: {e}")
         return False
 
-def test_recognition(image_path, expected_name=None):
-    """Test recognition on a single image"""
+def test_recognition(image_path, expected_name=None, writer_pool=None, write_futures=None):
+    """
+    Test recognition on a single image
+    
+    Args:
+        image_path: Path to the test image
+        expected_name: Name the faces should be recognized as, or None
+        writer_pool: Executor to write the result image on, written inline if None
+        write_futures: List collecting the futures of the submitted writes
+        
+    Returns:
+        True if faces were detected and recognized
+    """
     print(f"\nTesting recognition on: {image_path}")
     
     if not os.path.exists(image_path):
@@ -52,8 +71,8 @@ def test_recognition(image_path, expected_name=None):
     
     print(f"Image dimensions: {image.shape}")
     
-    # Extract faces
-    faces = extract_faces_from_image(image_path)
+    # Extract faces from the already decoded image
+    faces = extract_faces_from_numpy(image)
     
     if not faces:
         print("No faces detected in the image")
@@ -61,8 +80,14 @@ def test_recognition(image_path, expected_name=None):
     
     print(f"Detected {len(faces)} faces")
     
+    # Recognize all faces with one batched similarity computation
+    recognitions = recognize_faces_batch(np.stack([face['embedding'] for face in faces]))
+    
+    # Every face is drawn onto one copy of the image, saved once after the loop
+    result_img = image.copy()
+    
     # Process each face
-    for i, face in enumerate(faces):
+    for i, (face, recognition) in enumerate(zip(faces, recognitions)):
         bbox = face['bbox']
         embedding = face['embedding']
         
@@ -70,9 +95,6 @@ def test_recognition(image_path, expected_name=None):
         print(f"  - Bounding box: {bbox}")
         print(f"  - Embedding shape: {embedding.shape}")
         
-        # Recognize face
-        recognition = recognize_face(embedding)
-        
         print(f"  - Recognition result:")
         print(f"    * Name: {recognition['name']}")
         print(f"    * Similarity: {recognition['similarity']:.4f}")
@@ -86,8 +108,7 @@ def test_recognition(image_path, expected_name=None):
             else:
                 print(f"  ❌ Expected {expected_name}, got {recognition['name']}")
         
-        # Save result image with face box and name
-        result_img = image.copy()
+        # Draw this face's box and name on the result image
         x1, y1, x2, y2 = [int(v) for v in bbox]
         
         # Draw bounding box and name
@@ -97,11 +118,16 @@ def test_recognition(image_path, expected_name=None):
         # Add name and similarity
         text = f"{recognition['name']} ({recognition['similarity']:.2f})"
         cv2.putText(result_img, text, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-        
-        # Save the result
-        result_path = os.path.join(os.path.dirname(image_path), f"recognized_{os.path.basename(image_path)}")
-        cv2.imwrite(result_path, result_img)
-        print(f"  - Saved recognition result to {result_path}")
+    
+    # Save the result, result_img is not touched again so the writer thread can own it
+    result_path = os.path.join(os.path.dirname(image_path), f"recognized_{os.path.basename(image_path)}")
+    if writer_pool is not None:
+        future = writer_pool.submit(write_jpeg, result_path, result_img)
+        if write_futures is not None:
+            write_futures.append(future)
+    else:
+        write_jpeg(result_path, result_img)
+    print(f"Saving recognition result to {result_path}")
     
     return True
 
@@ -129,8 +155,16 @@ def main():
         ("test_face.jpg", None)
     ]
     
-    for image_path, expected_name in test_images:
-        test_recognition(image_path, expected_name)
+    # Result images are encoded and written in the background so disk I/O overlaps recognition
+    write_futures = []
+    with ThreadPoolExecutor(max_workers=2) as writer_pool:
+        for image_path, expected_name in test_images:
+            test_recognition(image_path, expected_name, writer_pool, write_futures)
+        
+        # Wait for the result images and report any that could not be written
+        failed_writes = check_writes(write_futures)
+        if failed_writes:
+            print(f"⚠️  {failed_writes} result images could not be written")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
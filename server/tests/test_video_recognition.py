@@ -10,9 +10,13 @@ import numpy as np
 import logging
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+from frame_reader import ThreadedFrameReader, batched
+from image_io import check_writes, write_jpeg
+from motion_detection import HAS_OPENCL, motion_ratio, motion_sample_indices
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,7 +26,7 @@ logger = logging.getLogger(__name__)
 try:
     from mediapipe_face import (
         init_face_recognition, 
-        detect_faces, 
+        detect_faces_batch,
         align_face,
         recognize_face,
         load_known_faces_from_db,
@@ -32,6 +36,103 @@ except ImportError:
     logger.error("Failed to import mediapipe_face module. Make sure it's in the same directory.")
     exit(1)
 
+# Selected frames sent to face detection per batch
+FACE_BATCH_SIZE = 8
+
+# HTML report fragments, filled in with str.format per person and per instance
+PERSON_HEADER_TEMPLATE = """
+            <div class="person">
+                <h2>{name}</h2>
+                <p>Found in {count} frames</p>
+                <div class="instances">
+        """
+INSTANCE_TEMPLATE = """
+                <div class="instance">
+                    <img src="{image_path}" alt="{name} at {time}">
+                    <p><span class="timestamp">Frame {frame} (Time: {time})</span><br>
+                    Similarity: <span class="similarity">{similarity:.4f}</span></p>
+                </div>
+            """
+PERSON_FOOTER = """
+                </div>
+            </div>
+        """
+
+def select_frames(frames: Iterable[Tuple[int, np.ndarray]], use_motion_detection: bool,
+                  motion_threshold: float, min_frame_gap: int,
+                  frame_interval: int) -> Iterator[Tuple[int, np.ndarray, float]]:
+    """
+    Filter decoded frames down to the ones to run face detection on
+    
+    Args:
+        frames: Iterable of (frame_idx, frame) tuples, e.g. a ThreadedFrameReader
+        use_motion_detection: Whether to use motion-based frame selection
+        motion_threshold: Minimum fraction of pixels that must change to trigger processing
+        min_frame_gap: Minimum frames to skip after processing a frame
+        frame_interval: Maximum interval between processed frames
+        
+    Returns:
+        Iterator over (frame_idx, frame, motion_score) for the selected frames
+    """
+    # Motion detection variables
+    prev_frame = None
+    small_bgr = None    # Downscaled colour scratch buffer, reused every frame
+    small_frame = None  # Downscaled buffer, swapped with prev_frame so only two exist
+    sample_idx = None   # Pixels for the quick motion pre-test, picked on the first frame
+    last_processed_frame = -min_frame_gap  # Force processing the first frame
+    
+    for frame_idx, frame in frames:
+        # Determine whether to process this frame
+        process_this_frame = False
+        motion_score = 0
+        
+        # Apply motion-based downsampling if enabled
+        if use_motion_detection:
+            if HAS_OPENCL:
+                # Downscale and convert on the OpenCL device, the frames stay there for the diff
+                small_frame = cv2.cvtColor(
+                    cv2.resize(cv2.UMat(frame), (0, 0), fx=0.25, fy=0.25,
+                               interpolation=cv2.INTER_AREA),
+                    cv2.COLOR_BGR2GRAY
+                )
+            else:
+                # Downscale first so grayscale conversion only touches 1/16 of the pixels,
+                # writing into the scratch buffers instead of allocating new arrays
+                small_bgr = cv2.resize(frame, (0, 0), dst=small_bgr, fx=0.25, fy=0.25,
+                                       interpolation=cv2.INTER_AREA)
+                small_frame = cv2.cvtColor(small_bgr, cv2.COLOR_BGR2GRAY, dst=small_frame)
+            
+            # Check for motion if we have a previous frame
+            if prev_frame is not None and frame_idx - last_processed_frame >= min_frame_gap:
+                if sample_idx is None and not HAS_OPENCL:
+                    sample_idx = motion_sample_indices(small_frame.size)
+                
+                # Calculate fraction of pixels that changed since the previous frame,
+                # skipping the full pass when a pixel sample shows well under the threshold
+                motion_score = motion_ratio(small_frame, prev_frame, sample_idx=sample_idx,
+                                            min_ratio=motion_threshold * 0.5)
+                
+                # Process frame if motion exceeds threshold or if we haven't processed a frame in a while
+                if motion_score > motion_threshold or frame_idx - last_processed_frame >= frame_interval:
+                    process_this_frame = True
+                    last_processed_frame = frame_idx
+                    
+                    if motion_score > motion_threshold:
+                        logger.info(f"Motion detected in frame {frame_idx} (score: {motion_score:.4f})")
+            elif frame_idx == 0 or frame_idx - last_processed_frame >= frame_interval:
+                # Always process first frame or if max interval reached
+                process_this_frame = True
+                last_processed_frame = frame_idx
+            
+            # Keep current frame for next iteration, the next frame is written over the older buffer
+            prev_frame, small_frame = small_frame, prev_frame
+        else:
+            # Original behavior: process every Nth frame
+            process_this_frame = (frame_idx % frame_interval == 0)
+        
+        if process_this_frame:
+            yield frame_idx, frame, motion_score
+
 def process_video(video_path: str, output_dir: str, 
                  frame_interval: int = 30, 
                  recognition_threshold: float = RECOGNITION_THRESHOLD,
@@ -79,151 +180,134 @@ def process_video(video_path: str, output_dir: str,
     
     # Recognition results
     recognition_results = {}
-    frame_idx = 0
     recognized_count = 0
     processed_count = 0
     
-    # Motion detection variables
-    prev_frame = None
-    last_processed_frame = -min_frame_gap  # Force processing the first frame
+    # Annotated output frame, reused across processed frames
+    result_frame = None
+    
+    # Side-by-side original/aligned face canvas, each face is resized straight into its halves
+    comparison = np.empty((224, 448, 3), dtype=np.uint8)
+    
+    # Background image writes, checked for failures once processing is done
+    write_futures = []
     
     # Process frames
     start_time = time.time()
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        # Determine whether to process this frame
-        process_this_frame = False
-        motion_score = 0
-        
-        # Apply motion-based downsampling if enabled
-        if use_motion_detection:
-            # Convert current frame to grayscale and resize for motion detection
-            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            small_frame = cv2.resize(gray_frame, (0, 0), fx=0.25, fy=0.25)
+    
+    # Decode on a background thread so codec work overlaps detection. Without motion
+    # detection only every Nth frame is used, the rest are grabbed without decoding
+    sample_interval = 1 if use_motion_detection else frame_interval
+    
+    # Output images are encoded and written on a second pool so detection does not wait on
+    # disk I/O. Leaving the block waits for the pending writes, also when processing raises
+    with ThreadPoolExecutor(max_workers=2) as writer_pool, \
+            ThreadedFrameReader(cap, sample_interval=sample_interval, queue_size=8) as reader:
+        frames = select_frames(reader, use_motion_detection, motion_threshold, min_frame_gap, frame_interval)
+        for batch in batched(frames, FACE_BATCH_SIZE):
+            # Detect faces for the whole batch
+            faces_batch = detect_faces_batch([selected[1] for selected in batch])
             
-            # Check for motion if we have a previous frame
-            if prev_frame is not None and frame_idx - last_processed_frame >= min_frame_gap:
-                # Calculate absolute difference between current and previous frame
-                frame_diff = cv2.absdiff(small_frame, prev_frame)
+            for (frame_idx, frame, motion_score), faces in zip(batch, faces_batch):
+                # Increment processed frames counter
+                processed_count += 1
                 
-                # Apply threshold to get significant changes
-                _, thresh = cv2.threshold(frame_diff, 25, 255, cv2.THRESH_BINARY)
-                
-                # Calculate fraction of pixels that changed
-                motion_score = np.count_nonzero(thresh) / thresh.size
+                # Progress indicator
+                if frame_idx % (frame_interval * 10) == 0:
+                    progress = frame_idx / frame_count * 100
+                    elapsed = time.time() - start_time
+                    remaining = (elapsed / (frame_idx + 1)) * (frame_count - frame_idx)
+                    logger.info(f"Processing frame {frame_idx}/{frame_count} ({progress:.1f}%), "
+                               f"ETA: {remaining:.1f}s" + 
+                               (f", Motion: {motion_score:.4f}" if use_motion_detection else ""))
+                    
+                # Recognized (name, similarity) pairs, all drawn on one copy of the frame
+                frame_recognitions = []
                 
-                # Process frame if motion exceeds threshold or if we haven't processed a frame in a while
-                if motion_score > motion_threshold or frame_idx - last_processed_frame >= frame_interval:
-                    process_this_frame = True
-                    last_processed_frame = frame_idx
+                # Process each face
+                for face_idx, face in enumerate(faces):
+                    # Get embedding
+                    embedding = face['embedding']
                     
-                    if motion_score > motion_threshold:
-                        logger.info(f"Motion detected in frame {frame_idx} (score: {motion_score:.4f})")
-            elif frame_idx == 0 or frame_idx - last_processed_frame >= frame_interval:
-                # Always process first frame or if max interval reached
-                process_this_frame = True
-                last_processed_frame = frame_idx
-            
-            # Store current frame for next iteration
-            prev_frame = small_frame
-        else:
-            # Original behavior: process every Nth frame
-            process_this_frame = (frame_idx % frame_interval == 0)
-            
-        if not process_this_frame:
-            frame_idx += 1
-            continue
-        
-        # Increment processed frames counter
-        processed_count += 1
-        
-        # Progress indicator
-        if frame_idx % (frame_interval * 10) == 0 or process_this_frame:
-            progress = frame_idx / frame_count * 100
-            elapsed = time.time() - start_time
-            remaining = (elapsed / (frame_idx + 1)) * (frame_count - frame_idx)
-            logger.info(f"Processing frame {frame_idx}/{frame_count} ({progress:.1f}%), "
-                       f"ETA: {remaining:.1f}s" + 
-                       (f", Motion: {motion_score:.4f}" if use_motion_detection else ""))
-            
-        # Detect faces
-        faces = detect_faces(frame)
-        
-        # Process each face
-        for face_idx, face in enumerate(faces):
-            # Get embedding
-            embedding = face['embedding']
-            
-            # Recognize face
-            recognition = recognize_face(embedding, threshold=recognition_threshold)
-            name = recognition['name']
-            similarity = recognition['similarity']
-            
-            # Skip unknown faces
-            if name == "Unknown":
-                continue
+                    # Recognize face
+                    recognition = recognize_face(embedding, threshold=recognition_threshold)
+                    name = recognition['name']
+                    similarity = recognition['similarity']
+                    
+                    # Skip unknown faces
+                    if name == "Unknown":
+                        continue
+                        
+                    # Draw rectangle and text
+                    bbox = face['bbox']
+                    x1, y1, x2, y2 = bbox
+                    
+                    # Copy the frame into the reusable result buffer on the first recognized face
+                    if not frame_recognitions:
+                        if result_frame is None or result_frame.shape != frame.shape:
+                            result_frame = np.empty_like(frame)
+                        np.copyto(result_frame, frame)
+                    cv2.rectangle(result_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                    
+                    # Add text with name and similarity
+                    text = f"{name} ({similarity:.2f})"
+                    cv2.putText(result_frame, text, (x1, y1 - 10), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                               
+                    # Save face alignment comparison
+                    aligned_face = face['aligned_face']
+                    face_img = face['face_image']
+                    
+                    # Create side-by-side comparison in the preallocated canvas
+                    cv2.resize(face_img, (224, 224), dst=comparison[:, :224])
+                    cv2.resize(aligned_face, (224, 224), dst=comparison[:, 224:])
+                    
+                    # Add labels
+                    cv2.putText(comparison, "Original", (20, 30), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                    cv2.putText(comparison, "Aligned", (224 + 20, 30), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                    
+                    # Save face comparison
+                    comparison_filename = f"comparison_{frame_idx:06d}_{name}_{similarity:.2f}.jpg"
+                    comparison_path = os.path.join(output_dir, comparison_filename)
+                    # Copy since the canvas is reused for the next face
+                    write_futures.append(writer_pool.submit(write_jpeg, comparison_path, comparison.copy()))
+                    
+                    frame_recognitions.append((name, similarity))
+                    
+                    logger.info(f"Frame {frame_idx}: Recognized {name} with similarity {similarity:.4f}")
+                    recognized_count += 1
                 
-            # Draw rectangle and text
-            bbox = face['bbox']
-            x1, y1, x2, y2 = bbox
-            
-            result_frame = frame.copy()
-            cv2.rectangle(result_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            
-            # Add text with name and similarity
-            text = f"{name} ({similarity:.2f})"
-            cv2.putText(result_frame, text, (x1, y1 - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                       
-            # Save face alignment comparison
-            aligned_face = face['aligned_face']
-            face_img = face['face_image']
-            
-            # Create side-by-side comparison
-            comparison = np.hstack([
-                cv2.resize(face_img, (224, 224)),
-                cv2.resize(aligned_face, (224, 224))
-            ])
-            
-            # Add labels
-            cv2.putText(comparison, "Original", (20, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.putText(comparison, "Aligned", (224 + 20, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            # Save results
-            timestamp = frame_idx / fps
-            minutes = int(timestamp / 60)
-            seconds = int(timestamp % 60)
-            
-            # Save frame with recognition
-            output_filename = f"frame_{frame_idx:06d}_{name}_{similarity:.2f}_{minutes:02d}m{seconds:02d}s.jpg"
-            output_path = os.path.join(output_dir, output_filename)
-            cv2.imwrite(output_path, result_frame)
-            
-            # Save face comparison
-            comparison_filename = f"comparison_{frame_idx:06d}_{name}_{similarity:.2f}.jpg"
-            comparison_path = os.path.join(output_dir, comparison_filename)
-            cv2.imwrite(comparison_path, comparison)
-            
-            # Save recognized time for reporting
-            if name not in recognition_results:
-                recognition_results[name] = []
-            
-            recognition_results[name].append({
-                'frame': frame_idx,
-                'time': f"{minutes:02d}:{seconds:02d}",
-                'similarity': similarity,
-                'image': output_filename
-            })
-            
-            logger.info(f"Frame {frame_idx}: Recognized {name} with similarity {similarity:.4f}")
-            recognized_count += 1
-        
-        frame_idx += 1
+                if frame_recognitions:
+                    # Save results
+                    timestamp = frame_idx / fps
+                    minutes = int(timestamp / 60)
+                    seconds = int(timestamp % 60)
+                    
+                    # Save frame with all recognitions once
+                    labels = "_".join(f"{name}_{similarity:.2f}" for name, similarity in frame_recognitions)
+                    output_filename = f"frame_{frame_idx:06d}_{labels}_{minutes:02d}m{seconds:02d}s.jpg"
+                    output_path = os.path.join(output_dir, output_filename)
+                    # Copy since result_frame is overwritten by the next processed frame
+                    write_futures.append(writer_pool.submit(write_jpeg, output_path, result_frame.copy()))
+                    
+                    # Save recognized time for reporting
+                    for name, similarity in frame_recognitions:
+                        if name not in recognition_results:
+                            recognition_results[name] = []
+                        
+                        recognition_results[name].append({
+                            'frame': frame_idx,
+                            'time': f"{minutes:02d}:{seconds:02d}",
+                            'similarity': similarity,
+                            'image': output_filename
+                        })
+    
+    # Report images that could not be written before linking them from the report
+    failed_writes = check_writes(write_futures)
+    if failed_writes:
+        logger.warning(f"{failed_writes} output images could not be written")
     
     # Release video capture
     cap.release()
@@ -249,82 +333,67 @@ def generate_html_report(recognition_results: Dict[str, List[Dict]],
     """Generate HTML report of recognition results"""
     report_path = os.path.join(output_dir, "recognition_report.html")
     
-    with open(report_path, "w") as f:
-        # Write HTML header
-        f.write("""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Face Recognition Report</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 20px; }
-                h1, h2 { color: #333; }
-                .person { margin-bottom: 30px; }
-                .instances { display: flex; flex-wrap: wrap; gap: 10px; }
-                .instance { 
-                    border: 1px solid #ddd; 
-                    padding: 10px; 
-                    border-radius: 5px;
-                    width: 300px;
-                }
-                .instance img { max-width: 100%; }
-                .timestamp { font-weight: bold; }
-                .similarity { color: green; }
-                .summary { margin-bottom: 20px; }
-            </style>
-        </head>
-        <body>
-            <h1>Face Recognition Report</h1>
-        """)
-        
-        # Write summary
-        video_name = os.path.basename(video_path)
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        f.write(f"""
-            <div class="summary">
-                <p><strong>Video:</strong> {video_name}</p>
-                <p><strong>Date:</strong> {current_time}</p>
-                <p><strong>Total identities:</strong> {len(recognition_results)}</p>
-            </div>
-        """)
+    # Build the whole document in memory and write it with a single call
+    parts = []
+    
+    # HTML header
+    parts.append("""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Face Recognition Report</title>
+        <style>
+            body { font-family: Arial, sans-serif; margin: 20px; }
+            h1, h2 { color: #333; }
+            .person { margin-bottom: 30px; }
+            .instances { display: flex; flex-wrap: wrap; gap: 10px; }
+            .instance { 
+                border: 1px solid #ddd; 
+                padding: 10px; 
+                border-radius: 5px;
+                width: 300px;
+            }
+            .instance img { max-width: 100%; }
+            .timestamp { font-weight: bold; }
+            .similarity { color: green; }
+            .summary { margin-bottom: 20px; }
+        </style>
+    </head>
+    <body>
+        <h1>Face Recognition Report</h1>
+    """)
+    
+    # Summary
+    video_name = os.path.basename(video_path)
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    parts.append(f"""
+        <div class="summary">
+            <p><strong>Video:</strong> {video_name}</p>
+            <p><strong>Date:</strong> {current_time}</p>
+            <p><strong>Total identities:</strong> {len(recognition_results)}</p>
+        </div>
+    """)
+    
+    # Results for each person
+    for name, instances in recognition_results.items():
+        parts.append(PERSON_HEADER_TEMPLATE.format(name=name, count=len(instances)))
         
-        # Write results for each person
-        for name, instances in recognition_results.items():
-            f.write(f"""
-                <div class="person">
-                    <h2>{name}</h2>
-                    <p>Found in {len(instances)} frames</p>
-                    <div class="instances">
-            """)
-            
-            # Show up to 10 instances
-            for instance in instances[:10]:
-                frame = instance['frame']
-                time = instance['time']
-                similarity = instance['similarity']
-                image = instance['image']
-                image_path = os.path.join(".", image)  # relative path
-                
-                f.write(f"""
-                    <div class="instance">
-                        <img src="{image_path}" alt="{name} at {time}">
-                        <p><span class="timestamp">Frame {frame} (Time: {time})</span><br>
-                        Similarity: <span class="similarity">{similarity:.4f}</span></p>
-                    </div>
-                """)
-            
-            f.write("""
-                    </div>
-                </div>
-            """)
+        # Show up to 10 instances
+        for instance in instances[:10]:
+            image_path = os.path.join(".", instance['image'])  # relative path
+            parts.append(INSTANCE_TEMPLATE.format(name=name, image_path=image_path, **instance))
         
-        # Write HTML footer
-        f.write("""
-        </body>
-        </html>
-        """)
+        parts.append(PERSON_FOOTER)
+    
+    # HTML footer
+    parts.append("""
+    </body>
+    </html>
+    """)
+    
+    Path(report_path).write_text("".join(parts), encoding="utf-8")
     
     logger.info(f"Generated HTML report: {report_path}")
 
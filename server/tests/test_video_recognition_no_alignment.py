@@ -10,9 +10,14 @@ import numpy as np
 import logging
 import time
 import argparse
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple
+from frame_reader import ThreadedFrameReader, batched
+from image_io import check_writes, write_jpeg
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -40,82 +45,272 @@ face_detector = mp_face_detection.FaceDetection(
     min_detection_confidence=0.5
 )
 
+# RGB copy of the current frame for MediaPipe, reused across calls (detection runs on one thread)
+rgb_frame = None
+
 # Initialize InsightFace
 import insightface
+import onnxruntime
+from insightface.utils import face_align
 insightface_app = None
 
+# Run the ONNX models on CUDA when onnxruntime-gpu is installed
+USE_CUDA = 'CUDAExecutionProvider' in onnxruntime.get_available_providers()
+DETECTION_SIZE = (640, 640)  # InsightFace detector input size
+
+# Minimum IoU between a MediaPipe box (with margin) and an InsightFace box to pair them
+MATCH_IOU_THRESHOLD = 0.2
+
+# Sampled frames sent through face detection and recognition per batch
+FACE_BATCH_SIZE = 8
+
+# HTML report fragments, filled in with str.format per person and per instance
+PERSON_HEADER_TEMPLATE = """
+                <div class="person">
+                    <h2>{name}</h2>
+                    <p>Found in {count} frames</p>
+                    <div class="instances">
+            """
+INSTANCE_TEMPLATE = """
+                    <div class="instance">
+                        <img src="{image}" alt="{name} at {time}">
+                        <p><span class="timestamp">Frame {frame} (Time: {time})</span><br>
+                        Similarity: <span class="similarity">{similarity:.4f}</span></p>
+                        <img src="{face_image}" alt="Face of {name} at {time}" style="width: 112px;">
+                    </div>
+                """
+PERSON_FOOTER = """
+                    </div>
+                </div>
+            """
+
+# Sampling intervals (in frames) at which seeking to each sample beats grabbing through
+# the frames in between. Seeking decodes forward from the previous keyframe, so it only
+# pays off once the interval is longer than a typical GOP
+SEEK_MIN_INTERVAL = 300
+
+# Detected faces are reused for sampled frames with the same perceptual hash
+FACE_CACHE_SIZE = 256      # Maximum number of cached frame hashes
+FACE_CACHE_MAX_AGE = 300   # Frames after which a cached result is detected again
+
+# Side of the grayscale thumbnail used for the static frame check and the frame hash
+FRAME_THUMB_SIZE = 32
+
+# Mean absolute gray-level difference of the thumbnail below which a sampled frame
+# counts as static and reuses the previous frame's faces without detection
+STATIC_FRAME_DIFF = 3.0
+
 def init_insightface():
-    """Initialize InsightFace for feature extraction"""
+    """Initialize InsightFace for feature extraction, on the GPU when CUDA is available"""
     global insightface_app
+    if insightface_app is not None:
+        # Sessions are created once per process, repeated runs reuse them
+        return True
+    
     model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
-    insightface_app = insightface.app.FaceAnalysis(name='buffalo_l', root=model_path)
-    insightface_app.prepare(ctx_id=-1)
+    
+    if USE_CUDA:
+        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+        ctx_id = 0
+    else:
+        providers = ['CPUExecutionProvider']
+        ctx_id = -1
+    logger.info(f"Running InsightFace with providers: {providers}")
+    
+    insightface_app = insightface.app.FaceAnalysis(name='buffalo_l', root=model_path, providers=providers)
+    insightface_app.prepare(ctx_id=ctx_id, det_size=DETECTION_SIZE)
     return True
 
-def detect_faces_no_alignment(image: np.ndarray) -> List[Dict]:
+def get_insightface_app():
+    """Return the shared InsightFace app, initializing it on first use"""
+    init_insightface()
+    return insightface_app
+
+def frame_hash(thumb: np.ndarray) -> bytes:
     """
-    Detect faces without alignment
+    Difference hash (dHash) of a frame thumbnail, equal for near-identical frames
+    
+    At 32x32 the hash has 992 bits, enough that frames with faces in different
+    places don't collide the way they do with an 8x8 hash.
+    
+    Args:
+        thumb: FRAME_THUMB_SIZE x FRAME_THUMB_SIZE grayscale thumbnail of the frame
+        
+    Returns:
+        Hash bytes, one bit per horizontally adjacent pixel pair
+    """
+    return np.packbits(thumb[:, 1:] > thumb[:, :-1]).tobytes()
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Pairwise intersection over union of two sets of boxes
+    
+    Args:
+        boxes_a: (M, 4) array of (x1, y1, x2, y2) boxes
+        boxes_b: (K, 4) array of (x1, y1, x2, y2) boxes
+        
+    Returns:
+        (M, K) array of IoU values
+    """
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    inter_w = np.maximum(0, np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]))
+    inter_h = np.maximum(0, np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]))
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+def mediapipe_face_boxes(image: np.ndarray,
+                         frame_size: Optional[Tuple[int, int]] = None) -> List[Tuple[Any, Tuple[int, int, int, int]]]:
+    """
+    Detect faces with MediaPipe and expand their boxes by a 20% margin
     
     Args:
         image: Input image in BGR format
+        frame_size: (width, height) the boxes are returned in, defaults to the image size.
+            Lets detection run on a downscaled copy of the frame
         
     Returns:
-        List of face dictionaries with bounding box and embedding
+        List of (detection, (x1, y1, x2, y2)) tuples
     """
-    # Convert to RGB for MediaPipe
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    global rgb_frame
+    
+    # Convert to RGB for MediaPipe, into the scratch frame instead of a new array
+    rgb_frame = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=rgb_frame)
     
     # Detect faces
-    results = face_detector.process(image_rgb)
+    results = face_detector.process(rgb_frame)
+    
+    if not results.detections:
+        return []
     
-    faces = []
-    if results.detections:
+    # Pixel boxes (x, y, w, h) for all detections at once, truncated like int()
+    if frame_size is None:
         height, width, _ = image.shape
-        for detection in results.detections:
-            # Get bounding box
-            bbox = detection.location_data.relative_bounding_box
-            x_min = max(0, int(bbox.xmin * width))
-            y_min = max(0, int(bbox.ymin * height))
-            width_face = int(bbox.width * width)
-            height_face = int(bbox.height * height)
-            
-            # Add some margin (20%)
-            margin_x = int(width_face * 0.2)
-            margin_y = int(height_face * 0.2)
-            x_min = max(0, x_min - margin_x)
-            y_min = max(0, y_min - margin_y)
-            width_face = min(width - x_min, width_face + 2 * margin_x)
-            height_face = min(height - y_min, height_face + 2 * margin_y)
-            
-            # Extract face region
-            face_img = image[y_min:y_min+height_face, x_min:x_min+width_face]
-            
-            if face_img.size == 0:
+    else:
+        width, height = frame_size
+    relative = np.array([[bbox.xmin, bbox.ymin, bbox.width, bbox.height]
+                         for bbox in (detection.location_data.relative_bounding_box
+                                      for detection in results.detections)])
+    pixel = np.trunc(relative * [width, height, width, height]).astype(np.int64)
+    top_left = np.maximum(pixel[:, :2], 0)
+    size = pixel[:, 2:]
+    
+    # Add some margin (20%), clipped to the frame
+    margin = np.trunc(size * 0.2).astype(np.int64)
+    top_left = np.maximum(top_left - margin, 0)
+    size = np.minimum([width, height] - top_left, size + 2 * margin)
+    bottom_right = top_left + size
+    
+    boxes = []
+    for detection, (x_min, y_min), (x_max, y_max), keep in zip(results.detections, top_left.tolist(),
+                                                              bottom_right.tolist(), (size > 0).all(axis=1)):
+        if keep:
+            boxes.append((detection, (x_min, y_min, x_max, y_max)))
+    
+    return boxes
+
+def detect_faces_batch_no_alignment(images: List[np.ndarray]) -> List[List[Dict]]:
+    """
+    Detect faces without alignment in several frames, computing all embeddings in one batch
+    
+    Args:
+        images: Input images in BGR format
+        
+    Returns:
+        List with one list of face dictionaries (bounding box and embedding) per image
+    """
+    app = get_insightface_app()
+    det_model = app.det_model
+    rec_model = app.models['recognition']
+    
+    frame_matches = []  # Matched (detection, box) pairs per image
+    crops = []          # Recognition inputs for every matched face, in order
+    for image in images:
+        matches = []
+        frame_matches.append(matches)
+        
+        # Downscale once to the detector input size with INTER_AREA, both detectors share it
+        height, width, _ = image.shape
+        scale = min(DETECTION_SIZE[0] / width, DETECTION_SIZE[1] / height, 1.0)
+        if scale < 1.0:
+            small = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            small = image
+        
+        # Collect MediaPipe boxes first, so InsightFace only runs when there is a face
+        boxes = mediapipe_face_boxes(small, frame_size=(width, height))
+        if not boxes:
+            continue
+        
+        try:
+            bboxes, kpss = det_model.detect(small, max_num=0, metric='default')
+        except Exception as e:
+            logger.error(f"Error running InsightFace detection: {e}")
+            continue
+        
+        if len(bboxes) == 0:
+            continue
+        
+        # Back to full frame coordinates, recognition crops come from the full frame
+        bboxes[:, :4] /= scale
+        kpss /= scale
+        
+        # Match each MediaPipe box to the InsightFace detection it overlaps most. Matching is
+        # one-to-one: when boxes compete for a detection only the best overlapping one keeps it
+        iou = box_iou(np.array([box for _, box in boxes], dtype=np.float32),
+                      bboxes[:, :4].astype(np.float32))
+        best_match = iou.argmax(axis=1)
+        best_iou = iou[np.arange(len(boxes)), best_match]
+        keep = (best_iou >= MATCH_IOU_THRESHOLD) & (iou.argmax(axis=0)[best_match] == np.arange(len(boxes)))
+        
+        for (detection, box), match_idx, matched in zip(boxes, best_match, keep):
+            if not matched:
                 continue
-                
-            # Get embeddings directly from InsightFace
-            try:
-                insight_faces = insightface_app.get(face_img)
-                if not insight_faces:
-                    continue
-                    
-                # Use the first face detection
-                best_face = insight_faces[0]
-                embedding = best_face.normed_embedding
-                
-                # Create face dictionary
-                face_data = {
-                    'bbox': (x_min, y_min, x_min+width_face, y_min+height_face),
-                    'confidence': float(detection.score[0]),
-                    'embedding': embedding,
-                    'face_image': face_img
-                }
-                
-                faces.append(face_data)
-            except Exception as e:
-                logger.error(f"Error getting face embedding: {e}")
+            matches.append((detection, box))
+            crops.append(face_align.norm_crop(image, landmark=kpss[match_idx],
+                                              image_size=rec_model.input_size[0]))
+    
+    if not crops:
+        return [[] for _ in images]
+    
+    # Get embeddings for every matched face with one recognition forward pass
+    try:
+        embeddings = rec_model.get_feat(crops)
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    except Exception as e:
+        logger.error(f"Error getting face embeddings: {e}")
+        return [[] for _ in images]
+    
+    results = []
+    embedding_idx = 0
+    for image, matches in zip(images, frame_matches):
+        faces = []
+        for detection, (x1, y1, x2, y2) in matches:
+            # Create face dictionary
+            faces.append({
+                'bbox': (x1, y1, x2, y2),
+                'confidence': float(detection.score[0]),
+                'embedding': embeddings[embedding_idx],
+                'face_image': image[y1:y2, x1:x2]
+            })
+            embedding_idx += 1
+        results.append(faces)
+    
+    return results
+
+def detect_faces_no_alignment(image: np.ndarray) -> List[Dict]:
+    """
+    Detect faces without alignment
     
-    return faces
+    Args:
+        image: Input image in BGR format
+        
+    Returns:
+        List of face dictionaries with bounding box and embedding
+    """
+    return detect_faces_batch_no_alignment([image])[0]
 
 def process_video(video_path: str, output_dir: str, 
                  frame_interval: int = 30, 
@@ -163,92 +358,152 @@ def process_video(video_path: str, output_dir: str,
     
     # Recognition results
     recognition_results = {}
-    frame_idx = 0
     recognized_count = 0
     
+    # Background image writes, checked for failures once processing is done
+    write_futures = []
+    
+    # Detected faces of recently seen frames by frame hash, LRU ordered
+    face_cache = OrderedDict()
+    cache_hits = 0
+    
+    # Thumbnail of the last frame that was not static, static frames reuse its faces
+    reference_thumb = None
+    static_hits = 0
+    last_faces = []  # Faces of the previous processed frame, without crops
+    
     # Process frames
     start_time = time.time()
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        # Process every Nth frame
-        if frame_idx % frame_interval != 0:
-            frame_idx += 1
-            continue
-        
-        # Progress indicator
-        if frame_idx % (frame_interval * 10) == 0:
-            progress = frame_idx / frame_count * 100
-            elapsed = time.time() - start_time
-            remaining = (elapsed / (frame_idx + 1)) * (frame_count - frame_idx)
-            logger.info(f"Processing frame {frame_idx}/{frame_count} ({progress:.1f}%), "
-                       f"ETA: {remaining:.1f}s")
-            
-        # Detect faces WITHOUT alignment
-        faces = detect_faces_no_alignment(frame)
-        
-        # Process each face
-        for face_idx, face in enumerate(faces):
-            # Get embedding
-            embedding = face['embedding']
+    
+    # Decode on a background thread so codec work overlaps detection, only every Nth
+    # frame is retrieved and the rest are grabbed, or skipped by seeking for long intervals
+    seek = frame_interval >= SEEK_MIN_INTERVAL
+    
+    # Output images are encoded and written on a second pool so detection does not wait on
+    # disk I/O. Leaving the block waits for the pending writes, also when processing raises
+    with ThreadPoolExecutor(max_workers=2) as writer_pool, \
+            ThreadedFrameReader(cap, sample_interval=frame_interval, queue_size=8, seek=seek) as reader:
+        for batch in batched(reader, FACE_BATCH_SIZE):
+            # Sampled (frame_idx, frame, hash, cached faces, static) of this batch
+            classified = []
+            for frame_idx, frame in batch:
+                # Frames that barely changed since the last non-static one reuse the previous faces
+                thumb = cv2.cvtColor(cv2.resize(frame, (FRAME_THUMB_SIZE, FRAME_THUMB_SIZE),
+                                                interpolation=cv2.INTER_AREA),
+                                     cv2.COLOR_BGR2GRAY)
+                if (reference_thumb is not None and
+                        cv2.norm(thumb, reference_thumb, cv2.NORM_L1) / thumb.size < STATIC_FRAME_DIFF):
+                    static_hits += 1
+                    classified.append((frame_idx, frame, None, None, True))
+                else:
+                    reference_thumb = thumb
+                    
+                    # Reuse the faces of a recent identical-looking frame instead of detecting again
+                    key = frame_hash(thumb)
+                    cached = face_cache.get(key)
+                    if cached is not None and frame_idx - cached[0] <= FACE_CACHE_MAX_AGE:
+                        face_cache.move_to_end(key)
+                        cache_hits += 1
+                        classified.append((frame_idx, frame, key, cached[1], False))
+                    else:
+                        classified.append((frame_idx, frame, key, None, False))
             
-            # Recognize face
-            recognition = recognize_face(embedding, threshold=recognition_threshold)
-            name = recognition['name']
-            similarity = recognition['similarity']
+            # Detect faces WITHOUT alignment for the frames neither static nor served by the cache
+            detected = iter(detect_faces_batch_no_alignment(
+                [selected[1] for selected in classified if selected[3] is None and not selected[4]]))
             
-            # Skip unknown faces
-            if name == "Unknown":
-                continue
+            for frame_idx, frame, key, cached_faces, static in classified:
+                if static:
+                    cached_faces = last_faces
+                elif cached_faces is None:
+                    faces = next(detected)
+                    
+                    # Cache without the face crops, which would keep the whole frame alive
+                    cached_faces = [{k: v for k, v in face.items() if k != 'face_image'} for face in faces]
+                    face_cache[key] = (frame_idx, cached_faces)
+                    face_cache.move_to_end(key)
+                    if len(face_cache) > FACE_CACHE_SIZE:
+                        face_cache.popitem(last=False)
+                last_faces = cached_faces
                 
-            # Draw rectangle and text
-            bbox = face['bbox']
-            x1, y1, x2, y2 = bbox
-            
-            result_frame = frame.copy()
-            cv2.rectangle(result_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            
-            # Add text with name and similarity
-            text = f"{name} ({similarity:.2f})"
-            cv2.putText(result_frame, text, (x1, y1 - 10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                # Crop the boxes from the current frame
+                faces = [dict(face, face_image=frame[face['bbox'][1]:face['bbox'][3],
+                                                     face['bbox'][0]:face['bbox'][2]])
+                         for face in cached_faces]
+                
+                # Progress indicator
+                if frame_idx % (frame_interval * 10) == 0:
+                    progress = frame_idx / frame_count * 100
+                    elapsed = time.time() - start_time
+                    remaining = (elapsed / (frame_idx + 1)) * (frame_count - frame_idx)
+                    logger.info(f"Processing frame {frame_idx}/{frame_count} ({progress:.1f}%), "
+                               f"ETA: {remaining:.1f}s")
+                
+                # Process each face
+                for face_idx, face in enumerate(faces):
+                    # Get embedding
+                    embedding = face['embedding']
+                    
+                    # Recognize face
+                    recognition = recognize_face(embedding, threshold=recognition_threshold)
+                    name = recognition['name']
+                    similarity = recognition['similarity']
+                    
+                    # Skip unknown faces
+                    if name == "Unknown":
+                        continue
                         
-            # Save face image
-            face_img = face['face_image']
-            
-            # Save results
-            timestamp = frame_idx / fps
-            minutes = int(timestamp / 60)
-            seconds = int(timestamp % 60)
-            
-            # Save frame with recognition
-            output_filename = f"frame_{frame_idx:06d}_{name}_{similarity:.2f}_{minutes:02d}m{seconds:02d}s.jpg"
-            output_path = os.path.join(output_dir, output_filename)
-            cv2.imwrite(output_path, result_frame)
-            
-            # Save face image
-            face_filename = f"face_{frame_idx:06d}_{name}_{similarity:.2f}.jpg"
-            face_path = os.path.join(output_dir, face_filename)
-            cv2.imwrite(face_path, cv2.resize(face_img, (224, 224)))
-            
-            # Save recognized time for reporting
-            if name not in recognition_results:
-                recognition_results[name] = []
-            
-            recognition_results[name].append({
-                'frame': frame_idx,
-                'time': f"{minutes:02d}:{seconds:02d}",
-                'similarity': similarity,
-                'image': output_filename,
-                'face_image': face_filename
-            })
-            
-            logger.info(f"Frame {frame_idx}: Recognized {name} with similarity {similarity:.4f}")
-            recognized_count += 1
-        
-        frame_idx += 1
+                    # Draw rectangle and text
+                    bbox = face['bbox']
+                    x1, y1, x2, y2 = bbox
+                    
+                    # Each recognition gets its own annotated copy, which the writer thread owns
+                    result_frame = frame.copy()
+                    cv2.rectangle(result_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                    
+                    # Add text with name and similarity
+                    text = f"{name} ({similarity:.2f})"
+                    cv2.putText(result_frame, text, (x1, y1 - 10), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                                
+                    # Save face image
+                    face_img = face['face_image']
+                    
+                    # Save results
+                    timestamp = frame_idx / fps
+                    minutes = int(timestamp / 60)
+                    seconds = int(timestamp % 60)
+                    
+                    # Save frame with recognition
+                    output_filename = f"frame_{frame_idx:06d}_{name}_{similarity:.2f}_{minutes:02d}m{seconds:02d}s.jpg"
+                    output_path = os.path.join(output_dir, output_filename)
+                    write_futures.append(writer_pool.submit(write_jpeg, output_path, result_frame))
+                    
+                    # Save face image
+                    face_filename = f"face_{frame_idx:06d}_{name}_{similarity:.2f}.jpg"
+                    face_path = os.path.join(output_dir, face_filename)
+                    write_futures.append(writer_pool.submit(write_jpeg, face_path, cv2.resize(face_img, (224, 224))))
+                    
+                    # Save recognized time for reporting
+                    # Parallel per-identity lists of raw values, formatted only when reporting
+                    if name not in recognition_results:
+                        recognition_results[name] = {'frames': [], 'times': [], 'sims': [],
+                                                     'images': [], 'faces': []}
+                    
+                    results = recognition_results[name]
+                    results['frames'].append(frame_idx)
+                    results['times'].append(timestamp)
+                    results['sims'].append(similarity)
+                    results['images'].append(output_filename)
+                    results['faces'].append(face_filename)
+                    
+                    logger.info(f"Frame {frame_idx}: Recognized {name} with similarity {similarity:.4f}")
+                    recognized_count += 1
+    
+    # Report images that could not be written before linking them from the report
+    failed_writes = check_writes(write_futures)
+    if failed_writes:
+        logger.warning(f"{failed_writes} output images could not be written")
     
     # Release video capture
     cap.release()
@@ -259,97 +514,87 @@ def process_video(video_path: str, output_dir: str,
     # Log summary
     total_time = time.time() - start_time
     logger.info(f"Processing complete WITHOUT alignment. Total time: {total_time:.2f}s")
-    logger.info(f"Processed {frame_idx} frames, recognized {recognized_count} faces")
+    logger.info(f"Processed {reader.frames_read} frames, recognized {recognized_count} faces")
+    logger.info(f"Reused cached faces for {cache_hits} sampled frames, "
+                f"previous faces for {static_hits} static frames")
     logger.info(f"Found {len(recognition_results)} unique identities")
-    for name, instances in recognition_results.items():
-        logger.info(f"  {name}: {len(instances)} instances")
+    for name, results in recognition_results.items():
+        logger.info(f"  {name}: {len(results['frames'])} instances")
 
-def generate_html_report(recognition_results: Dict[str, List[Dict]], 
+def generate_html_report(recognition_results: Dict[str, Dict[str, List]], 
                         output_dir: str, video_path: str) -> None:
     """Generate HTML report of recognition results"""
     report_path = os.path.join(output_dir, "recognition_report_no_alignment.html")
     
-    with open(report_path, "w") as f:
-        # Write HTML header
-        f.write("""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Face Recognition Report (NO ALIGNMENT)</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 20px; }
-                h1, h2 { color: #333; }
-                .person { margin-bottom: 30px; }
-                .instances { display: flex; flex-wrap: wrap; gap: 10px; }
-                .instance { 
-                    border: 1px solid #ddd; 
-                    padding: 10px; 
-                    border-radius: 5px;
-                    width: 300px;
-                }
-                .instance img { max-width: 100%; }
-                .timestamp { font-weight: bold; }
-                .similarity { color: green; }
-                .summary { margin-bottom: 20px; }
-                .note { color: red; font-weight: bold; }
-            </style>
-        </head>
-        <body>
-            <h1>Face Recognition Report (NO ALIGNMENT)</h1>
-            <p class="note">This test was run WITHOUT the face alignment step.</p>
-        """)
-        
-        # Write summary
-        video_name = os.path.basename(video_path)
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        f.write(f"""
-            <div class="summary">
-                <p><strong>Video:</strong> {video_name}</p>
-                <p><strong>Date:</strong> {current_time}</p>
-                <p><strong>Total identities:</strong> {len(recognition_results)}</p>
-            </div>
-        """)
+    # Build the whole document in memory and write it with a single call
+    parts = []
+    
+    # HTML header
+    parts.append("""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Face Recognition Report (NO ALIGNMENT)</title>
+        <style>
+            body { font-family: Arial, sans-serif; margin: 20px; }
+            h1, h2 { color: #333; }
+            .person { margin-bottom: 30px; }
+            .instances { display: flex; flex-wrap: wrap; gap: 10px; }
+            .instance { 
+                border: 1px solid #ddd; 
+                padding: 10px; 
+                border-radius: 5px;
+                width: 300px;
+            }
+            .instance img { max-width: 100%; }
+            .timestamp { font-weight: bold; }
+            .similarity { color: green; }
+            .summary { margin-bottom: 20px; }
+            .note { color: red; font-weight: bold; }
+        </style>
+    </head>
+    <body>
+        <h1>Face Recognition Report (NO ALIGNMENT)</h1>
+        <p class="note">This test was run WITHOUT the face alignment step.</p>
+    """)
+    
+    # Summary
+    video_name = os.path.basename(video_path)
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    parts.append(f"""
+        <div class="summary">
+            <p><strong>Video:</strong> {video_name}</p>
+            <p><strong>Date:</strong> {current_time}</p>
+            <p><strong>Total identities:</strong> {len(recognition_results)}</p>
+        </div>
+    """)
+    
+    # Results for each person, with the template methods bound once outside the loops
+    add_part = parts.append
+    format_header = PERSON_HEADER_TEMPLATE.format
+    format_instance = INSTANCE_TEMPLATE.format
+    for name, results in recognition_results.items():
+        add_part(format_header(name=name, count=len(results['frames'])))
         
-        # Write results for each person
-        for name, instances in recognition_results.items():
-            f.write(f"""
-                <div class="person">
-                    <h2>{name}</h2>
-                    <p>Found in {len(instances)} frames</p>
-                    <div class="instances">
-            """)
-            
-            # Show up to 10 instances
-            for instance in instances[:10]:
-                frame = instance['frame']
-                time = instance['time']
-                similarity = instance['similarity']
-                image = instance['image']
-                face_image = instance['face_image']
-                image_path = os.path.join(".", image)  # relative path
-                face_path = os.path.join(".", face_image)  # relative path
-                
-                f.write(f"""
-                    <div class="instance">
-                        <img src="{image_path}" alt="{name} at {time}">
-                        <p><span class="timestamp">Frame {frame} (Time: {time})</span><br>
-                        Similarity: <span class="similarity">{similarity:.4f}</span></p>
-                        <img src="{face_path}" alt="Face of {name} at {time}" style="width: 112px;">
-                    </div>
-                """)
-            
-            f.write("""
-                    </div>
-                </div>
-            """)
+        # Show up to 10 instances
+        instances = zip(results['frames'], results['times'], results['sims'],
+                        results['images'], results['faces'])
+        for frame, timestamp, similarity, image, face_image in itertools.islice(instances, 10):
+            add_part(format_instance(
+                name=name, frame=frame, similarity=similarity, image=image, face_image=face_image,
+                time=f"{int(timestamp / 60):02d}:{int(timestamp % 60):02d}"))
         
-        # Write HTML footer
-        f.write("""
-        </body>
-        </html>
-        """)
+        add_part(PERSON_FOOTER)
+    
+    # HTML footer
+    parts.append("""
+    </body>
+    </html>
+    """)
+    
+    Path(report_path).write_text("".join(parts), encoding="utf-8")
     
     logger.info(f"Generated HTML report: {report_path}")
 
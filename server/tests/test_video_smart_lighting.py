@@ -101,6 +101,9 @@ def test_smart_lighting_on_video(video_path, camera_role='living_room'):
     
     start_time = time.time()
     
+    # Room state after the previous processed frame, so each frame polls the controller once
+    prev_room_state = controller.get_room_state(camera_role)
+    
     while cap.isOpened():
         ret, frame = cap.read()
         if not ret:
@@ -112,45 +115,42 @@ def test_smart_lighting_on_video(video_path, camera_role='living_room'):
             
             # Process frame with smart lighting automation
             try:
-                # Store the controller state before processing
-                prev_state = controller.get_status_summary()
-                prev_room_state = prev_state['rooms'].get(camera_role, {})
-                
                 # Process the frame
                 controller.process_frame(frame, camera_role)
                 
                 # Get current state after processing
-                current_state = controller.get_status_summary()
-                current_room_state = current_state['rooms'].get(camera_role, {})
+                current_room_state = controller.get_room_state(camera_role)
                 
                 # Track detections
-                if current_room_state.get('person_present', False):
+                if current_room_state.person_present:
                     stats['person_detections'] += 1
                 
-                if current_room_state.get('lights_on', False):
+                if current_room_state.lights_on:
                     stats['lights_on_detections'] += 1
                 else:
                     stats['lights_off_detections'] += 1
                 
                 # Check for state changes
-                if prev_room_state.get('lights_on') != current_room_state.get('lights_on'):
+                if prev_room_state.lights_on != current_room_state.lights_on:
                     timestamp = frame_number / fps
                     change = {
                         'frame': frame_number,
                         'time': f"{int(timestamp//60):02d}:{int(timestamp%60):02d}",
-                        'lights_on': current_room_state.get('lights_on', False),
-                        'person_present': current_room_state.get('person_present', False)
+                        'lights_on': current_room_state.lights_on,
+                        'person_present': current_room_state.person_present
                     }
                     stats['state_changes'].append(change)
                     print(f"   🔄 State change at {change['time']}: Lights {'ON' if change['lights_on'] else 'OFF'}")
                 
                 # Check for notifications
-                if (current_room_state.get('has_pending_notification', False) and 
-                    not prev_room_state.get('has_pending_notification', False)):
+                if (current_room_state.has_pending_notification and 
+                    not prev_room_state.has_pending_notification):
                     stats['notifications_sent'] += 1
                     timestamp = frame_number / fps
                     print(f"   📱 Notification sent at {int(timestamp//60):02d}:{int(timestamp%60):02d}")
                 
+                prev_room_state = current_room_state
+                
                 # Progress update every 10 processed frames
                 if stats['frames_processed'] % 10 == 0:
                     progress = frame_number / frame_count * 100
@@ -4,12 +4,142 @@ Test script to verify YOLOv11x model works correctly
 """
 
 import os
+import shutil
 import sys
 import cv2
 import numpy as np
 import time
 import requests
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+# Input size the TensorRT engine is built for
+INFERENCE_SIZE = 640
+
+# Frames per call for the batched throughput check
+BATCH_SIZE = 8
+
+# Person-like shape on black (body, head, eyes, mouth), used when the sample download fails
+FALLBACK_IMAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'fallback.png')
+
+# Draw detections and save test_yolo_result.jpg only when OWL_TEST_VISUALIZE is set
+VISUALIZE = bool(os.environ.get('OWL_TEST_VISUALIZE'))
+
+def get_inference_weights(model_path):
+    """
+    Pick the weights to run inference with, exporting a TensorRT engine on first use
+    
+    On CUDA machines the .pt model is exported once to a sibling FP16 .engine file that
+    later runs load directly. The engine has a dynamic batch dimension of up to BATCH_SIZE
+    so it serves both the single-image and the batched check. Without CUDA (or TensorRT)
+    the .pt weights are used as is.
+    
+    Args:
+        model_path: Path to the PyTorch .pt weights
+        
+    Returns:
+        Path to the .engine file if available, otherwise model_path
+    """
+    engine_path = os.path.splitext(model_path)[0] + '.engine'
+    if os.path.exists(engine_path):
+        return engine_path
+    
+    try:
+        import torch
+        from ultralytics import YOLO
+        if not torch.cuda.is_available():
+            return model_path
+        
+        print("Exporting YOLOv11x to a TensorRT engine (one-time)...")
+        YOLO(model_path).export(format='engine', half=True, imgsz=INFERENCE_SIZE,
+                                batch=BATCH_SIZE, dynamic=True)
+        return engine_path if os.path.exists(engine_path) else model_path
+    except Exception as e:
+        print(f"WARNING: TensorRT export failed, using PyTorch weights: {e}")
+        return model_path
+
+def download_file(url, path, timeout=10):
+    """
+    Stream a file to disk in chunks instead of buffering the whole response
+    
+    Args:
+        url: URL to download
+        path: Destination file path
+        timeout: Connection and read timeout in seconds
+        
+    Returns:
+        True if the file was downloaded
+    """
+    partial_path = path + '.part'
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            return False
+        with open(partial_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+    # Only a complete download replaces the destination
+    os.replace(partial_path, path)
+    return True
+
+def prepare_test_image(test_img_path):
+    """
+    Make sure a test image exists, downloading a sample or copying the fallback image
+    
+    Args:
+        test_img_path: Where the test image should be
+        
+    Returns:
+        True if the test image is in place
+    """
+    try:
+        if os.path.exists(test_img_path) and os.path.getsize(test_img_path) > 0:
+            # Reuse the image from a previous run instead of downloading it again
+            print(f"Using existing test image: {test_img_path}")
+            return True
+        
+        # Try to download a sample image with people
+        print("Downloading a sample image...")
+        sample_url = "https://raw.githubusercontent.com/ultralytics/yolov5/master/data/images/zidane.jpg"
+        if download_file(sample_url, test_img_path):
+            print(f"Downloaded sample image to {test_img_path}")
+            return True
+        
+        # If download fails, use the pre-drawn person-like test image
+        print("Failed to download sample image, using the fallback test image...")
+        shutil.copyfile(FALLBACK_IMAGE_PATH, test_img_path)
+        print(f"Copied fallback test image to {test_img_path}")
+        return True
+    except Exception as e:
+        print(f"Error creating test image: {e}")
+        return False
+
+def timed_predict(model, source, use_cuda, **predict_args):
+    """
+    Run one prediction and measure its latency
+    
+    Args:
+        model: Loaded YOLO model
+        source: Image array or list of image arrays
+        use_cuda: Time with CUDA events around a synchronized call instead of time.time()
+        **predict_args: Extra arguments for model.predict
+        
+    Returns:
+        Tuple of (results, elapsed seconds)
+    """
+    if use_cuda:
+        import torch
+        torch.cuda.synchronize()
+        start_event = torch.cuda.Event(enable_timing=True)
+        end_event = torch.cuda.Event(enable_timing=True)
+        start_event.record()
+        results = model.predict(source, **predict_args)
+        end_event.record()
+        torch.cuda.synchronize()
+        return results, start_event.elapsed_time(end_event) / 1000
+    
+    start_time = time.time()
+    results = model.predict(source, **predict_args)
+    return results, time.time() - start_time
 
 def test_yolo_model():
     """Test if YOLOv11x model can be loaded and run"""
@@ -31,88 +161,96 @@ def test_yolo_model():
         print("ERROR: Failed to import ultralytics. Make sure it's installed with: pip install ultralytics")
         return False
     
-    # Try to load model
-    try:
-        model = YOLO(model_path)
-        print("Successfully loaded YOLOv11x model")
-    except Exception as e:
-        print(f"ERROR: Failed to load model: {e}")
-        return False
-    
-    # Create or download a test image
+    # Create or download the test image on a background thread while the model loads (or is
+    # exported to TensorRT). Only network and file I/O runs there, imports stay on this thread
     test_img_path = "test_yolo.jpg"
-    
-    try:
-        # Try to download a sample image with people
-        print("Downloading a sample image...")
-        sample_url = "https://raw.githubusercontent.com/ultralytics/yolov5/master/data/images/zidane.jpg"
-        response = requests.get(sample_url)
+    with ThreadPoolExecutor(max_workers=1) as image_pool:
+        image_ready = image_pool.submit(prepare_test_image, test_img_path)
         
-        if response.status_code == 200:
-            with open(test_img_path, "wb") as f:
-                f.write(response.content)
-            print(f"Downloaded sample image to {test_img_path}")
-        else:
-            # If download fails, create a simple test image
-            print("Failed to download sample image, creating a test image...")
-            img_size = 640
-            img = np.zeros((img_size, img_size, 3), dtype=np.uint8)
+        # Try to load model
+        try:
+            weights_path = get_inference_weights(model_path)
+            model = YOLO(weights_path, task='detect')
+            print(f"Successfully loaded YOLOv11x model from {os.path.basename(weights_path)}")
             
-            # Draw a person-like shape (more realistic)
-            # Body
-            cv2.rectangle(img, (img_size//3, img_size//3), (2*img_size//3, 3*img_size//4), (200, 200, 200), -1)
-            # Head
-            cv2.circle(img, (img_size//2, img_size//4), img_size//8, (200, 200, 200), -1)
-            # Eyes
-            cv2.circle(img, (img_size//2 - 15, img_size//4 - 10), 5, (0, 0, 0), -1)
-            cv2.circle(img, (img_size//2 + 15, img_size//4 - 10), 5, (0, 0, 0), -1)
-            # Mouth
-            cv2.ellipse(img, (img_size//2, img_size//4 + 10), (20, 10), 0, 0, 180, (0, 0, 0), 2)
-            
-            cv2.imwrite(test_img_path, img)
-            print(f"Created test image: {test_img_path}")
-    except Exception as e:
-        print(f"Error creating test image: {e}")
+            import torch
+            use_cuda = torch.cuda.is_available()
+            if use_cuda:
+                # Let FP32 matmuls use TF32 Tensor Cores on Ampere+ GPUs, and have cuDNN pick the
+                # fastest convolution algorithms for the fixed input shape on the first (warm-up) run
+                torch.set_float32_matmul_precision('high')
+                torch.backends.cudnn.benchmark = True
+        except Exception as e:
+            print(f"ERROR: Failed to load model: {e}")
+            return False
+        
+        if not image_ready.result():
+            return False
+    
+    # Decode the test image once and feed the array, so predict() skips its own file
+    # read and decode; the same array is then annotated with the results
+    img = cv2.imread(test_img_path, cv2.IMREAD_COLOR)
+    if img is None:
+        print(f"ERROR: Could not decode test image {test_img_path}")
         return False
     
     # Run inference
     try:
+        # FP16 on the GPU halves activation bandwidth and runs convolutions on Tensor Cores.
+        # Pascal and older cards have no fast FP16 path, so expect no speedup there
+        if use_cuda:
+            predict_args = {'half': True, 'device': 0}
+        else:
+            predict_args = {'device': 'cpu'}
+        
+        # Warm up so the timed call excludes CUDA context setup, cuDNN algorithm
+        # selection and lazy kernel loading (the second pass settles the autotuner)
+        print("Warming up...")
+        warmup_img = np.zeros((INFERENCE_SIZE, INFERENCE_SIZE, 3), dtype=np.uint8)
+        for _ in range(2):
+            model.predict(warmup_img, verbose=False, **predict_args)
+        
         print("Running inference...")
-        start_time = time.time()
-        results = model(test_img_path)
-        inference_time = time.time() - start_time
+        results, inference_time = timed_predict(model, img, use_cuda, **predict_args)
         print(f"Inference completed in {inference_time:.2f} seconds")
         
-        # Get the original image for visualization
-        img = cv2.imread(test_img_path)
+        # Batched call, the way video frames are fed to the model; a single image leaves
+        # the GPU underutilized, so per-image latency should drop well below the above
+        print(f"Running batched inference ({BATCH_SIZE} frames)...")
+        model.predict([img] * BATCH_SIZE, verbose=False, **predict_args)  # warm up this batch size
+        _, batch_time = timed_predict(model, [img] * BATCH_SIZE, use_cuda, verbose=False, **predict_args)
+        print(f"Batched inference completed in {batch_time:.2f} seconds "
+              f"({batch_time / BATCH_SIZE * 1000:.1f} ms per image)")
         
-        # Process results
+        # Process results, copying each result's boxes to the CPU in one transfer
+        # (rows are x1, y1, x2, y2, confidence, class id) instead of once per attribute
         detections = []
         for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                confidence = float(box.conf[0])
-                class_id = int(box.cls[0])
-                class_name = model.names[class_id]
-                
-                detections.append({
-                    'class': class_name,
-                    'confidence': confidence,
-                    'box': (x1, y1, x2, y2)
-                })
-                
-                # Draw on image
+            data = result.boxes.data.cpu().numpy()
+            xyxy = data[:, :4].astype(int).tolist()
+            confidences = data[:, 4].tolist()
+            class_ids = data[:, 5].astype(int).tolist()
+            
+            detections.extend({
+                'class': model.names[class_id],
+                'confidence': confidence,
+                'box': tuple(box)
+            } for box, confidence, class_id in zip(xyxy, confidences, class_ids))
+        
+        # Draw and save the result image (skipped on headless runs)
+        if VISUALIZE:
+            for det in detections:
+                x1, y1, x2, y2 = det['box']
                 cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(img, f"{class_name} {confidence:.2f}", (x1, y1-10), 
+                cv2.putText(img, f"{det['class']} {det['confidence']:.2f}", (x1, y1-10), 
                             cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+            cv2.imwrite("test_yolo_result.jpg", img)
         
-        # Save result image
-        cv2.imwrite("test_yolo_result.jpg", img)
-        
+        # One write for the whole list instead of one print per detection
         print(f"Found {len(detections)} objects:")
-        for i, det in enumerate(detections):
-            print(f"  {i+1}. {det['class']} ({det['confidence']:.2f})")
+        if detections:
+            print("\n".join(f"  {i+1}. {det['class']} ({det['confidence']:.2f})"
+                            for i, det in enumerate(detections)))
         
         return len(detections) > 0
     except Exception as e:
@@ -128,12 +266,16 @@ def test_video_processor_integration():
         sys.path.append(os.path.dirname(os.path.abspath(__file__)))
         import video_processor
         
+        # Make init_face_detection load its own weights from disk rather than reuse the
+        # model loaded when the module was imported
+        video_processor.model = None
+        
         # Initialize face detection
         result = video_processor.init_face_detection()
         
         if result:
             print("Successfully initialized face detection in video_processor.py")
-            if hasattr(video_processor, 'model'):
+            if video_processor.model is not None:
                 model_type = type(video_processor.model).__name__
                 print(f"Model loaded in video_processor: {model_type}")
                 return True
@@ -148,6 +290,9 @@ def test_video_processor_integration():
         return False
 
 if __name__ == "__main__":
+    # Flush every line even when stdout is a pipe (CI), so progress shows up as it happens
+    sys.stdout.reconfigure(line_buffering=True)
+    
     print("YOLOv11x Model Test Script")
     print("=========================")
     
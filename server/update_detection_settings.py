@@ -8,6 +8,13 @@ import sys
 import json
 import logging
 
+# Optional orjson for faster parsing and serialization, falls back to the stdlib json module
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -19,13 +26,28 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Largest settings payload accepted, bigger arguments are rejected before parsing
+MAX_SETTINGS_SIZE = 64 * 1024
+
+def json_loads(text):
+    """Parse JSON text (orjson.JSONDecodeError subclasses json.JSONDecodeError)"""
+    if HAS_ORJSON:
+        return orjson.loads(text)
+    return json.loads(text)
+
+def json_dumps(obj):
+    """Serialize an object to a JSON string"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
 def main():
     """Update detection class settings"""
     try:
         # Check if settings JSON is provided as a command-line argument
         if len(sys.argv) != 2:
             logger.error("Missing settings JSON argument")
-            print(json.dumps({
+            print(json_dumps({
                 'success': False,
                 'message': 'Missing settings JSON argument'
             }))
@@ -34,43 +56,51 @@ def main():
         settings_json = sys.argv[1]
         logger.info(f"Received settings JSON: {settings_json[:100]}...")
         
+        if len(settings_json) > MAX_SETTINGS_SIZE:
+            logger.error(f"Settings JSON too large: {len(settings_json)} characters")
+            print(json_dumps({
+                'success': False,
+                'message': f'Settings JSON too large (max {MAX_SETTINGS_SIZE} characters)'
+            }))
+            sys.exit(1)
+        
         try:
             # Parse the JSON to validate it
-            settings = json.loads(settings_json)
-            
-            # Import video_processor module to use the update function
-            sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-            from video_processor import update_detection_class_settings
-            
-            # Update the settings
-            result = update_detection_class_settings(settings_json)
-            
-            if result:
-                logger.info("Detection class settings updated successfully")
-                print(json.dumps({
-                    'success': True,
-                    'message': 'Detection class settings updated successfully'
-                }))
-                sys.exit(0)
-            else:
-                logger.error("Failed to update detection class settings")
-                print(json.dumps({
-                    'success': False,
-                    'message': 'Failed to update detection class settings'
-                }))
-                sys.exit(1)
-                
+            json_loads(settings_json)
         except json.JSONDecodeError:
             logger.error("Invalid JSON format")
-            print(json.dumps({
+            print(json_dumps({
                 'success': False,
                 'message': 'Invalid JSON format'
             }))
             sys.exit(1)
         
+        # Import video_processor module to use the update function. It pulls in
+        # ultralytics/torch/cv2, so only valid settings pay for the import
+        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+        from video_processor import update_detection_class_settings
+        
+        # Update the settings
+        result = update_detection_class_settings(settings_json)
+        
+        if result:
+            logger.info("Detection class settings updated successfully")
+            print(json_dumps({
+                'success': True,
+                'message': 'Detection class settings updated successfully'
+            }))
+            sys.exit(0)
+        else:
+            logger.error("Failed to update detection class settings")
+            print(json_dumps({
+                'success': False,
+                'message': 'Failed to update detection class settings'
+            }))
+            sys.exit(1)
+        
     except Exception as e:
         logger.error(f"Error updating detection class settings: {e}")
-        print(json.dumps({
+        print(json_dumps({
             'success': False,
             'message': f'Error: {str(e)}'
         }))
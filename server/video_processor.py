@@ -18,11 +18,15 @@ import sys
 from typing import Dict, Optional, Union, List, Any
 from light_detection import LightDetector
 from light_detector_manager import get_manager
+from frame_reader import ThreadedFrameReader, batched
+from detection_writer import ThreadedDetectionWriter
+from motion_detection import motion_ratio, warm_up_motion_kernel
 
 # Import our custom MediaPipe+InsightFace module
 try:
     from mediapipe_face import (
         detect_faces,
+        detect_faces_batch,
         extract_faces_from_image,
         recognize_face,
         init_face_recognition,
@@ -86,18 +90,38 @@ MIN_FRAME_GAP = 5  # Minimum frames between processing
 USE_MOTION_DETECTION = True  # Enable motion-based frame downsampling
 MOTION_THRESHOLD = 0.05      # Motion sensitivity (0.01-0.05 typical range)
 MIN_FRAME_GAP = 5            # Minimum frames to skip after processing a frame
+FACE_BATCH_SIZE = 8          # Selected frames sent to face detection per batch
+YOLO_BATCH_SIZE = 8          # Selected frames sent to YOLO per batch
 
 # Updated confidence thresholds per requirements
 PERSON_DETECTION_THRESHOLD = 0.5  # For person detection (50%)
 FACE_RECOGNITION_THRESHOLD = 0.5  # For face recognition (50%)
 OBJECT_DETECTION_THRESHOLD = 0.95  # For other object detection (95%)
 NOTIFICATION_ENABLED = True
+DETECTION_SETTINGS_TTL = 30  # Seconds before detection class settings are re-read during a video
+
+# Row inserts executed in batches by the detection writer thread. Positional parameters
+# with tuple rows let executemany fold each batch into one multi-row INSERT
+DETECTION_INSERT_SQL = """
+    INSERT INTO detections 
+    (video_id, detection_type, object_class, confidence, frame_number, 
+     bounding_box, camera_role, start_frame, end_frame, notify)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+LIGHTING_EVENT_INSERT_SQL = """
+    INSERT INTO lighting_events 
+    (video_id, frame_number, lighting_state, previous_state, confidence,
+     camera_role, timestamp, brightness_level, detection_method)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+DB_WRITE_BATCH_SIZE = 128  # Rows per executemany + commit on the writer thread
 
 # Global variables
 db_config = DEFAULT_DB_CONFIG
 model = None
 known_faces: List = []
 known_encodings: List = []
+known_encodings_matrix: Optional[np.ndarray] = None  # known_encodings stacked as an (N, D) float32 matrix
 known_names: List[str] = []
 known_access: Dict = {}
 HAS_FACE_RECOGNITION = False
@@ -242,7 +266,10 @@ def init_face_detection():
     try:
         from ultralytics import YOLO
         yolo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolo11x.pt')
-        if os.path.exists(yolo_path):
+        if isinstance(model, YOLO) and model.ckpt_path == yolo_path:
+            # These exact weights are already loaded (e.g. init called twice), don't load a second copy
+            logger.info("Using already loaded YOLO model")
+        elif os.path.exists(yolo_path):
             model = YOLO(yolo_path)
             logger.info("YOLOv11x model loaded successfully")
         else:
@@ -294,9 +321,57 @@ def safe_int(value, default=0):
         except (ValueError, TypeError):
             return default
 
+# Load detection class settings as a class id lookup
+def load_detection_settings(cursor):
+    """
+    Read the detection class settings once and flatten them for per-box lookups
+    
+    Args:
+        cursor: Dictionary cursor on an open database connection
+        
+    Returns:
+        Dict mapping YOLO class id to (detection_enabled, notifications_enabled). Classes
+        missing from the result (or all classes if no settings exist) are enabled by default
+    """
+    try:
+        cursor.execute("SELECT settings_value FROM app_settings WHERE settings_key = 'detection_classes'")
+        settings_row = cursor.fetchone()
+    except Exception as e:
+        logger.warning(f"Could not fetch detection settings from database (table may not exist): {e}")
+        logger.info(f"Falling back to detecting all YOLOv11x classes by default")
+        return {}
+    
+    if not (settings_row and isinstance(settings_row, dict) and 'settings_value' in settings_row):
+        logger.debug(f"No detection settings found, enabling all YOLOv11x classes by default")
+        return {}
+    
+    settings_map = {}
+    try:
+        detection_settings = json.loads(str(settings_row['settings_value']))
+        for category_key, category_data in detection_settings.items():
+            # Class is only enabled if both category and class settings are enabled,
+            # notifications only if the category has notifications enabled
+            category_enabled = category_data.get('enabled', True)
+            notifications_enabled = category_data.get('notifications', False)
+            for class_key, class_settings in category_data.get('classes', {}).items():
+                try:
+                    class_id = int(class_key)
+                except ValueError:
+                    continue
+                # The first category listing a class decides its settings
+                if class_id not in settings_map:
+                    class_enabled = class_settings.get('enabled', True)
+                    settings_map[class_id] = (category_enabled and class_enabled, notifications_enabled)
+    except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+        logger.error(f"Error parsing detection class settings: {e}")
+        # Fall back to detecting all YOLOv11x classes
+        return {}
+    
+    return settings_map
+
 # Load known faces from database
 def load_known_faces():
-    global known_faces, known_encodings, known_names, known_access
+    global known_faces, known_encodings, known_encodings_matrix, known_names, known_access
     
     try:
         conn = get_db_connection()
@@ -337,12 +412,79 @@ def load_known_faces():
                 except Exception as e:
                     logger.error(f"Error parsing face encoding for {safe_get(face, 'name', 'Unknown')}: {e}")
         
+        # Stack the encodings once so matching is a single vectorized distance computation
+        known_encodings_matrix = None
+        if known_encodings and len({encoding.shape for encoding in known_encodings}) == 1 \
+                and known_encodings[0].ndim == 1:
+            known_encodings_matrix = np.ascontiguousarray(np.vstack(known_encodings), dtype=np.float32)
+        
         logger.info(f"Loaded {len(known_encodings)} known faces")
         return known_faces
     except Exception as e:
         logger.error(f"Error loading known faces: {e}")
         return []
 
+# Pick the frames worth analysing, by motion or at a fixed interval
+def select_frames(frames):
+    """
+    Filter decoded frames down to the ones to run detection on
+    
+    With motion detection a frame is selected when enough pixels changed since the
+    previous frame (at least MIN_FRAME_GAP frames after the last selected one), or when
+    FRAME_INTERVAL frames passed without a selection. Otherwise every FRAME_INTERVAL-th
+    frame is selected.
+    
+    Args:
+        frames: Iterable of (frame_number, frame) tuples, e.g. a ThreadedFrameReader
+        
+    Returns:
+        Iterator over (frame_number, frame, motion_score) for the selected frames
+    """
+    # Motion detection variables
+    prev_frame = None
+    small_bgr = None    # Downscaled colour scratch buffer, reused every frame
+    small_frame = None  # Downscaled buffer, ping-ponged with prev_frame
+    last_processed_frame = -MIN_FRAME_GAP  # Force processing the first frame
+    
+    for frame_number, frame in frames:
+        # Determine whether to process this frame
+        process_this_frame = False
+        motion_score = 0
+        
+        # Apply motion-based downsampling if enabled
+        if USE_MOTION_DETECTION:
+            # Downscale first so grayscale conversion only touches 1/16 of the pixels,
+            # writing into the scratch buffers instead of allocating new arrays
+            small_bgr = cv2.resize(frame, (0, 0), dst=small_bgr, fx=0.25, fy=0.25,
+                                   interpolation=cv2.INTER_AREA)
+            small_frame = cv2.cvtColor(small_bgr, cv2.COLOR_BGR2GRAY, dst=small_frame)
+            
+            # Check for motion if we have a previous frame
+            if prev_frame is not None and frame_number - last_processed_frame >= MIN_FRAME_GAP:
+                # Calculate fraction of pixels that changed since the previous frame
+                motion_score = motion_ratio(small_frame, prev_frame)
+                
+                # Process frame if motion exceeds threshold or if we haven't processed a frame in a while
+                if motion_score > MOTION_THRESHOLD or frame_number - last_processed_frame >= FRAME_INTERVAL:
+                    process_this_frame = True
+                    last_processed_frame = frame_number
+                    
+                    if motion_score > MOTION_THRESHOLD:
+                        logger.info(f"Motion detected in frame {frame_number} (score: {motion_score:.4f})")
+            elif frame_number == 0 or frame_number - last_processed_frame >= FRAME_INTERVAL:
+                # Always process first frame or if max interval reached
+                process_this_frame = True
+                last_processed_frame = frame_number
+            
+            # Keep current frame for next iteration, the next frame is written over the older buffer
+            prev_frame, small_frame = small_frame, prev_frame
+        else:
+            # Original behavior: process every Nth frame
+            process_this_frame = (frame_number % FRAME_INTERVAL == 0)
+        
+        if process_this_frame:
+            yield frame_number, frame, motion_score
+
 # Process a video file with YOLO
 def process_video_yolo(video_id):
     try:
@@ -375,11 +517,6 @@ def process_video_yolo(video_id):
         fps = cap.get(cv2.CAP_PROP_FPS)
         frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        # Motion detection variables
-        prev_frame = None
-        last_processed_frame = -MIN_FRAME_GAP  # Force processing the first frame
-        
-        frame_number = 0
         processed_count = 0
         recognized_count = 0
         recognition_results = {}
@@ -392,430 +529,311 @@ def process_video_yolo(video_id):
             light_detector = LightDetector(light_config)
             logger.info(f"Light detector initialized for camera: {camera_role_str}")
         
+        # Detection class settings, re-read periodically so changes apply to long videos
+        detection_settings = load_detection_settings(cursor)
+        detection_settings_time = time.time()
+        
+        # JIT the motion kernel up front so the first frames don't stall behind compilation
+        if USE_MOTION_DETECTION:
+            warm_up_motion_kernel()
+        
         logger.info(f"Processing video ID {video_id}: {frame_count} total frames, {fps} fps")
         start_time = time.time()
         
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Determine whether to process this frame
-            process_this_frame = False
-            motion_score = 0
-            
-            # Apply motion-based downsampling if enabled
-            if USE_MOTION_DETECTION:
-                # Convert current frame to grayscale and resize for motion detection
-                gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                small_frame = cv2.resize(gray_frame, (0, 0), fx=0.25, fy=0.25)
+        # Three stages: frames are decoded on a reader thread, analysis runs here and
+        # detection rows are inserted in batches on a writer thread with its own connection.
+        # Without motion detection only every Nth frame is used, the rest are grabbed without decoding
+        sample_interval = 1 if USE_MOTION_DETECTION else FRAME_INTERVAL
+        with ThreadedFrameReader(cap, sample_interval=sample_interval, queue_size=8) as reader, \
+                ThreadedDetectionWriter(get_db_connection, batch_size=DB_WRITE_BATCH_SIZE) as detection_writer:
+            for batch in batched(select_frames(reader), YOLO_BATCH_SIZE):
+                # Run YOLO once for the whole batch to find persons and objects, then handle
+                # each frame in order
+                if isinstance(model, YOLO):
+                    if time.time() - detection_settings_time > DETECTION_SETTINGS_TTL:
+                        detection_settings = load_detection_settings(cursor)
+                        detection_settings_time = time.time()
+                    
+                    batch_results = model([selected[1] for selected in batch], verbose=False)
+                else:
+                    batch_results = [None] * len(batch)
                 
-                # Check for motion if we have a previous frame
-                if prev_frame is not None and frame_number - last_processed_frame >= MIN_FRAME_GAP:
-                    # Calculate absolute difference between current and previous frame
-                    frame_diff = cv2.absdiff(small_frame, prev_frame)
+                for (frame_number, frame, motion_score), yolo_result in zip(batch, batch_results):
+                    # Increment processed frames counter
+                    processed_count += 1
                     
-                    # Apply threshold to get significant changes
-                    _, thresh = cv2.threshold(frame_diff, 25, 255, cv2.THRESH_BINARY)
+                    # Perform light detection on this frame
+                    if light_detector:
+                        try:
+                            timestamp = datetime.fromtimestamp(time.time() + (frame_number / fps))
+                            light_results = light_detector.analyze_frame(frame, timestamp)
+                            
+                            # Check if lighting state changed
+                            if light_results.get('state_changed', False):
+                                new_state = light_results.get('lighting_state')
+                                previous_state = light_results.get('previous_state')
+                                confidence = light_results.get('state_confidence', 0.0)
+                                
+                                logger.info(f"Frame {frame_number}: Lighting changed from {previous_state} to {new_state} "
+                                          f"(confidence: {confidence:.2f})")
+                                
+                                # Store lighting change in database, batched on the writer thread
+                                detection_writer.put(LIGHTING_EVENT_INSERT_SQL, (
+                                    video_id, frame_number, new_state, previous_state, confidence,
+                                    camera_role_str, timestamp,
+                                    light_results['metrics'].get('mean_brightness', 0), 'global_brightness'
+                                ))
+                                
+                                # 🔔 SMART LIGHTING NOTIFICATIONS: Send detailed notifications for lighting changes
+                                if NOTIFICATION_ENABLED:
+                                    send_smart_lighting_notification(
+                                        step=f'lights_turned_{new_state}',
+                                        room=camera_role_str,
+                                        message=f"Lights turned {new_state} in {camera_role_str} (confidence: {confidence:.1%})",
+                                        lightState=new_state,
+                                        confidence=confidence,
+                                        brightness=light_results['metrics'].get('mean_brightness', 0)
+                                    )
+                            
+                        except Exception as e:
+                            logger.error(f"Error in light detection for frame {frame_number}: {e}")
                     
-                    # Calculate fraction of pixels that changed
-                    motion_score = np.count_nonzero(thresh) / thresh.size
+                    # Smart lighting automation processing
+                    if smart_lighting_controller and camera_role:
+                        try:
+                            smart_lighting_controller.process_frame(frame, str(camera_role))
+                        except Exception as e:
+                            logger.error(f"Error in smart lighting automation for frame {frame_number}: {e}")
                     
-                    # Process frame if motion exceeds threshold or if we haven't processed a frame in a while
-                    if motion_score > MOTION_THRESHOLD or frame_number - last_processed_frame >= FRAME_INTERVAL:
-                        process_this_frame = True
-                        last_processed_frame = frame_number
-                        
-                        if motion_score > MOTION_THRESHOLD:
-                            logger.info(f"Motion detected in frame {frame_number} (score: {motion_score:.4f})")
-                elif frame_number == 0 or frame_number - last_processed_frame >= FRAME_INTERVAL:
-                    # Always process first frame or if max interval reached
-                    process_this_frame = True
-                    last_processed_frame = frame_number
-                
-                # Store current frame for next iteration
-                prev_frame = small_frame
-            else:
-                # Original behavior: process every Nth frame
-                process_this_frame = (frame_number % FRAME_INTERVAL == 0)
-            
-            if not process_this_frame:
-                frame_number += 1
-                continue
-                
-            # Increment processed frames counter
-            processed_count += 1
-            
-            # Perform light detection on this frame
-            if light_detector:
-                try:
-                    timestamp = datetime.fromtimestamp(time.time() + (frame_number / fps))
-                    light_results = light_detector.analyze_frame(frame, timestamp)
+                    # Progress indicator
+                    if frame_number % (FRAME_INTERVAL * 10) == 0:
+                        progress = frame_number / frame_count * 100
+                        elapsed = time.time() - start_time
+                        remaining = (elapsed / (frame_number + 1)) * (frame_count - frame_number)
+                        logger.info(f"Processing frame {frame_number}/{frame_count} ({progress:.1f}%), "
+                                  f"ETA: {remaining:.1f}s" + 
+                                  (f", Motion: {motion_score:.4f}" if USE_MOTION_DETECTION else ""))
                     
-                    # Check if lighting state changed
-                    if light_results.get('state_changed', False):
-                        new_state = light_results.get('lighting_state')
-                        previous_state = light_results.get('previous_state')
-                        confidence = light_results.get('state_confidence', 0.0)
-                        
-                        logger.info(f"Frame {frame_number}: Lighting changed from {previous_state} to {new_state} "
-                                  f"(confidence: {confidence:.2f})")
-                        
-                        # Store lighting change in database (will create table if needed)
-                        try:
-                            lighting_data = {
-                                'video_id': video_id,
-                                'frame_number': frame_number,
-                                'lighting_state': new_state,
-                                'previous_state': previous_state,
-                                'confidence': confidence,
-                                'camera_role': camera_role_str,
-                                'timestamp': timestamp,
-                                'brightness_level': light_results['metrics'].get('mean_brightness', 0),
-                                'detection_method': 'global_brightness'
-                            }
+                    # First, handle this frame's YOLO detections
+                    if yolo_result is not None:
+                        boxes = yolo_result.boxes
+                        for box in boxes:
+                            # Get detection info
+                            x1, y1, x2, y2 = map(int, box.xyxy[0])
+                            confidence = float(box.conf[0])
+                            class_id = int(box.cls[0])
+                            class_name = model.names[class_id]
                             
-                            cursor.execute("""
-                                INSERT INTO lighting_events 
-                                (video_id, frame_number, lighting_state, previous_state, confidence,
-                                 camera_role, timestamp, brightness_level, detection_method)
-                                VALUES (%(video_id)s, %(frame_number)s, %(lighting_state)s, %(previous_state)s, 
-                                        %(confidence)s, %(camera_role)s, %(timestamp)s, %(brightness_level)s, %(detection_method)s)
-                            """, lighting_data)
-                            conn.commit()
-                        except mysql.connector.Error as db_err:
-                            if "doesn't exist" in str(db_err):
-                                logger.warning("lighting_events table doesn't exist. Skipping light detection storage.")
+                            # Check if this detection class is enabled in user settings
+                            # Default to enabling all YOLOv11x classes if not found in settings
+                            detection_enabled, notifications_enabled = detection_settings.get(class_id, (True, True))
+                            
+                            # Skip if detection is disabled for this class
+                            if not detection_enabled:
+                                logger.debug(f"Skipping disabled detection class: {class_name} (id: {class_id})")
+                                continue
+                            
+                            # Apply appropriate confidence threshold based on detection type
+                            threshold_to_use = OBJECT_DETECTION_THRESHOLD  # Default for objects
+                            
+                            # Determine detection type
+                            if class_name in ['person']:
+                                detection_type = 'person'
+                                threshold_to_use = PERSON_DETECTION_THRESHOLD
+                            elif class_name in ['dog', 'cat', 'bird', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe']:
+                                detection_type = 'animal'
                             else:
-                                logger.error(f"Database error storing light detection: {db_err}")
-                        
-                        # 🔔 SMART LIGHTING NOTIFICATIONS: Send detailed notifications for lighting changes
-                        if NOTIFICATION_ENABLED:
-                            send_smart_lighting_notification(
-                                step=f'lights_turned_{new_state}',
-                                room=camera_role_str,
-                                message=f"Lights turned {new_state} in {camera_role_str} (confidence: {confidence:.1%})",
-                                lightState=new_state,
-                                confidence=confidence,
-                                brightness=light_results['metrics'].get('mean_brightness', 0)
-                            )
-                    
-                except Exception as e:
-                    logger.error(f"Error in light detection for frame {frame_number}: {e}")
-            
-            # Smart lighting automation processing
-            if smart_lighting_controller and camera_role:
-                try:
-                    smart_lighting_controller.process_frame(frame, str(camera_role))
-                except Exception as e:
-                    logger.error(f"Error in smart lighting automation for frame {frame_number}: {e}")
-            
-            # Progress indicator
-            if frame_number % (FRAME_INTERVAL * 10) == 0 or process_this_frame:
-                progress = frame_number / frame_count * 100
-                elapsed = time.time() - start_time
-                remaining = (elapsed / (frame_number + 1)) * (frame_count - frame_number)
-                logger.info(f"Processing frame {frame_number}/{frame_count} ({progress:.1f}%), "
-                          f"ETA: {remaining:.1f}s" + 
-                          (f", Motion: {motion_score:.4f}" if USE_MOTION_DETECTION else ""))
-            
-            # First, run YOLO detection to find persons and objects
-            if isinstance(model, YOLO):
-                results = model(frame)
+                                detection_type = 'object'
+                            
+                            # Skip if below confidence threshold
+                            if confidence < threshold_to_use:
+                                continue
+                            
+                            # Calculate 5 seconds before and after (in frames)
+                            seconds_buffer = 5
+                            start_frame = max(0, frame_number - int(fps * seconds_buffer))
+                            end_frame = min(frame_count, frame_number + int(fps * seconds_buffer))
+                            
+                            # Store detection in database
+                            # Queued for the writer thread, which inserts and commits in batches.
+                            # notify is the notification flag from the detection settings
+                            detection_writer.put(DETECTION_INSERT_SQL, (
+                                video_id, detection_type, class_name, confidence, frame_number,
+                                json.dumps({'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}),
+                                camera_role, start_frame, end_frame, notifications_enabled
+                            ))
                 
-                for result in results:
-                    boxes = result.boxes
-                    for box in boxes:
-                        # Get detection info
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        confidence = float(box.conf[0])
-                        class_id = int(box.cls[0])
-                        class_name = model.names[class_id]
+                    # Now, use MediaPipe for face detection and recognition directly on the frame
+                    # This is the same approach as in test_video_recognition.py
+                    if HAS_MEDIAPIPE:
+                        # Detect faces using MediaPipe
+                        faces = detect_faces(frame)
                         
-                        # Check if this detection class is enabled in user settings
-                        # Default to enabling all YOLOv11x classes if no settings found
-                        detection_enabled = True
-                        notifications_enabled = True
-                        
-                        try:
-                            # First, fetch the latest detection class settings from the database
-                            cursor.execute("SELECT settings_value FROM app_settings WHERE settings_key = 'detection_classes'")
-                            settings_row = cursor.fetchone()
+                        # Process each face
+                        for face_idx, face in enumerate(faces):
+                            # Get face details
+                            x1, y1, x2, y2 = face['bbox']
+                            confidence = face.get('confidence', 0.9)
+                            embedding = face['embedding']
                             
-                            if settings_row and isinstance(settings_row, dict) and 'settings_value' in settings_row:
-                                try:
-                                    settings_value = str(settings_row['settings_value'])
-                                    detection_settings = json.loads(settings_value)
-                                    
-                                    # Find which category this class belongs to and check both category and class settings
-                                    class_found_in_settings = False
-                                    for category_key, category_data in detection_settings.items():
-                                        # First check if this class is in this category
-                                        category_classes = category_data.get('classes', {})
-                                        if str(class_id) in category_classes:
-                                            class_found_in_settings = True
-                                            # Check if the category itself is enabled
-                                            category_enabled = category_data.get('enabled', True)
+                            # Calculate 5 seconds before and after (in frames)
+                            seconds_buffer = 5
+                            start_frame = max(0, frame_number - int(fps * seconds_buffer))
+                            end_frame = min(frame_count, frame_number + int(fps * seconds_buffer))
+                            
+                            # Default values
+                            person_name = "Unknown person"
+                            is_authorized = False
+                            face_recognized = False
+                            
+                            # Recognize face using MediaPipe
+                            try:
+                                recognition = recognize_face(embedding, threshold=FACE_RECOGNITION_THRESHOLD)
+                                # Handle the recognition result properly based on its actual type
+                                if recognition:
+                                    if isinstance(recognition, dict):
+                                        # If it's already a dict, use it directly
+                                        if recognition.get('name') != "Unknown":
+                                            person_name = recognition.get('name')
+                                            similarity = recognition.get('similarity', FACE_RECOGNITION_THRESHOLD)
+                                            face_recognized = True
+                                            recognized_count += 1
                                             
-                                            # Check if the specific class is enabled
-                                            class_settings = category_classes.get(str(class_id), {})
-                                            class_enabled = class_settings.get('enabled', True)
+                                            # Track recognized faces for reporting
+                                            if person_name not in recognition_results:
+                                                recognition_results[person_name] = []
                                             
-                                            # Class is only enabled if both category and class settings are enabled
-                                            detection_enabled = category_enabled and class_enabled
+                                            # Calculate timestamp
+                                            timestamp = frame_number / fps
+                                            minutes = int(timestamp / 60)
+                                            seconds = int(timestamp % 60)
+                                            time_str = f"{minutes:02d}:{seconds:02d}"
                                             
-                                            # Notifications are only enabled if category has notifications enabled
-                                            notifications_enabled = category_data.get('notifications', False)
+                                            # Add to recognition results
+                                            recognition_results[person_name].append({
+                                                'frame': frame_number,
+                                                'time': time_str,
+                                                'similarity': similarity
+                                            })
                                             
-                                            break
-                                    
-                                    # If class not found in settings, enable by default (all YOLOv11x classes)
-                                    if not class_found_in_settings:
-                                        logger.debug(f"Class {class_name} (id: {class_id}) not found in settings, enabling by default")
-                                        detection_enabled = True
-                                        notifications_enabled = True
-                                        
-                                except (json.JSONDecodeError, KeyError, TypeError) as e:
-                                    logger.error(f"Error parsing detection class settings: {e}")
-                                    # Fall back to detecting all YOLOv11x classes
-                                    detection_enabled = True
-                                    notifications_enabled = True
-                            else:
-                                # No settings found - detect all YOLOv11x classes by default
-                                logger.debug(f"No detection settings found, enabling all YOLOv11x classes by default")
-                                detection_enabled = True
-                                notifications_enabled = True
-                                
-                        except Exception as e:
-                            logger.warning(f"Could not fetch detection settings from database (table may not exist): {e}")
-                            # Fall back to detecting all YOLOv11x classes
-                            logger.info(f"Falling back to detecting all YOLOv11x classes by default")
-                            detection_enabled = True
-                            notifications_enabled = True
-                        
-                        # Skip if detection is disabled for this class
-                        if not detection_enabled:
-                            logger.debug(f"Skipping disabled detection class: {class_name} (id: {class_id})")
-                            continue
-                        
-                        # Apply appropriate confidence threshold based on detection type
-                        threshold_to_use = OBJECT_DETECTION_THRESHOLD  # Default for objects
-                        
-                        # Determine detection type
-                        if class_name in ['person']:
-                            detection_type = 'person'
-                            threshold_to_use = PERSON_DETECTION_THRESHOLD
-                        elif class_name in ['dog', 'cat', 'bird', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe']:
-                            detection_type = 'animal'
-                        else:
-                            detection_type = 'object'
-                        
-                        # Skip if below confidence threshold
-                        if confidence < threshold_to_use:
-                            continue
-                        
-                        # Calculate 5 seconds before and after (in frames)
-                        seconds_buffer = 5
-                        start_frame = max(0, frame_number - int(fps * seconds_buffer))
-                        end_frame = min(frame_count, frame_number + int(fps * seconds_buffer))
-                        
-                        # Store detection in database
-                        detection_data = {
-                            'video_id': video_id,
-                            'detection_type': detection_type,
-                            'object_class': class_name,
-                            'confidence': confidence,
-                            'frame_number': frame_number,
-                            'bounding_box': json.dumps({'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}),
-                            'camera_role': camera_role,
-                            'start_frame': start_frame,
-                            'end_frame': end_frame,
-                            'notify': notifications_enabled  # Add notification flag based on settings
-                        }
-                        
-                        cursor.execute("""
-                            INSERT INTO detections 
-                            (video_id, detection_type, object_class, confidence, frame_number, 
-                             bounding_box, camera_role, start_frame, end_frame, notify)
-                            VALUES (%(video_id)s, %(detection_type)s, %(object_class)s, %(confidence)s, 
-                                    %(frame_number)s, %(bounding_box)s, %(camera_role)s, %(start_frame)s, %(end_frame)s, %(notify)s)
-                        """, detection_data)
-                        detection_id = cursor.lastrowid
-                        conn.commit()
-            
-            # Now, use MediaPipe for face detection and recognition directly on the frame
-            # This is the same approach as in test_video_recognition.py
-            if HAS_MEDIAPIPE:
-                # Detect faces using MediaPipe
-                faces = detect_faces(frame)
-                
-                # Process each face
-                for face_idx, face in enumerate(faces):
-                    # Get face details
-                    x1, y1, x2, y2 = face['bbox']
-                    confidence = face.get('confidence', 0.9)
-                    embedding = face['embedding']
-                    
-                    # Calculate 5 seconds before and after (in frames)
-                    seconds_buffer = 5
-                    start_frame = max(0, frame_number - int(fps * seconds_buffer))
-                    end_frame = min(frame_count, frame_number + int(fps * seconds_buffer))
-                    
-                    # Default values
-                    person_name = "Unknown person"
-                    is_authorized = False
-                    face_recognized = False
-                    
-                    # Recognize face using MediaPipe
-                    try:
-                        recognition = recognize_face(embedding, threshold=FACE_RECOGNITION_THRESHOLD)
-                        # Handle the recognition result properly based on its actual type
-                        if recognition:
-                            if isinstance(recognition, dict):
-                                # If it's already a dict, use it directly
-                                if recognition.get('name') != "Unknown":
-                                    person_name = recognition.get('name')
-                                    similarity = recognition.get('similarity', FACE_RECOGNITION_THRESHOLD)
-                                    face_recognized = True
-                                    recognized_count += 1
-                                    
-                                    # Track recognized faces for reporting
-                                    if person_name not in recognition_results:
-                                        recognition_results[person_name] = []
-                                    
-                                    # Calculate timestamp
-                                    timestamp = frame_number / fps
-                                    minutes = int(timestamp / 60)
-                                    seconds = int(timestamp % 60)
-                                    time_str = f"{minutes:02d}:{seconds:02d}"
-                                    
-                                    # Add to recognition results
-                                    recognition_results[person_name].append({
-                                        'frame': frame_number,
-                                        'time': time_str,
-                                        'similarity': similarity
-                                    })
-                                    
-                                    logger.info(f"Frame {frame_number}: Recognized {person_name} with similarity {similarity:.4f}")
-                                    
-                                    # Check authorization for this camera
-                                    if person_name in known_access:
-                                        cam_key = str(camera_role).lower().replace(' ', '_') if isinstance(camera_role, str) else 'unknown'
-                                        is_authorized = known_access[person_name].get(cam_key, False)
-                            elif isinstance(recognition, tuple) and len(recognition) >= 2:
-                                # If it's a tuple (name, similarity, ...), extract values
-                                name, similarity = recognition[0], recognition[1]
-                                if name != "Unknown":
-                                    person_name = name
-                                    face_recognized = True
-                                    recognized_count += 1
-                                    
-                                    # Track recognized faces for reporting
-                                    if person_name not in recognition_results:
-                                        recognition_results[person_name] = []
-                                    
-                                    # Calculate timestamp
-                                    timestamp = frame_number / fps
-                                    minutes = int(timestamp / 60)
-                                    seconds = int(timestamp % 60)
-                                    time_str = f"{minutes:02d}:{seconds:02d}"
-                                    
-                                    # Add to recognition results
-                                    recognition_results[person_name].append({
-                                        'frame': frame_number,
-                                        'time': time_str,
-                                        'similarity': similarity
-                                    })
-                                    
-                                    logger.info(f"Frame {frame_number}: Recognized {person_name} with similarity {similarity:.4f}")
-                                    
-                                    # Check authorization for this camera
-                                    if person_name in known_access:
-                                        cam_key = str(camera_role).lower().replace(' ', '_') if isinstance(camera_role, str) else 'unknown'
-                                        is_authorized = known_access[person_name].get(cam_key, False)
-                    except Exception as e:
-                        logger.error(f"Error during face recognition: {e}")
-                    
-                    # Store face detection in database
-                    face_data = {
-                        'video_id': video_id,
-                        'frame_number': frame_number,
-                        'person_name': person_name,
-                        'confidence': confidence,
-                        'bounding_box': json.dumps({'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}),
-                        'camera_role': camera_role,
-                        'start_frame': start_frame,
-                        'end_frame': end_frame
-                    }
-                    
-                    cursor.execute("""
-                        INSERT INTO faces 
-                        (video_id, frame_number, person_name, confidence, 
-                         bounding_box, camera_role, start_frame, end_frame)
-                        VALUES (%(video_id)s, %(frame_number)s, %(person_name)s, %(confidence)s,
-                                %(bounding_box)s, %(camera_role)s, %(start_frame)s, %(end_frame)s)
-                    """, face_data)
-                    face_id = cursor.lastrowid
-                    conn.commit()
-                    
-                    # Log face detection results
-                    if face_recognized:
-                        logger.info(f"Face recognized: {person_name} (authorized: {is_authorized})")
-                    else:
-                        logger.info("Face detected but not recognized")
-                    
-                    # If known face and recognized, record the match
-                    if face_recognized and person_name != "Unknown person":
-                        known_face_id = next((safe_get(face_db, 'known_face_id') for face_db in known_faces 
-                                          if safe_get(face_db, 'name') == person_name), None)
-                        if known_face_id:
-                            match_data = {
-                                'face_id': face_id,
-                                'known_face_id': known_face_id,
-                                'similarity_score': similarity,
-                                'is_authorized': is_authorized
+                                            logger.info(f"Frame {frame_number}: Recognized {person_name} with similarity {similarity:.4f}")
+                                            
+                                            # Check authorization for this camera
+                                            if person_name in known_access:
+                                                cam_key = str(camera_role).lower().replace(' ', '_') if isinstance(camera_role, str) else 'unknown'
+                                                is_authorized = known_access[person_name].get(cam_key, False)
+                                    elif isinstance(recognition, tuple) and len(recognition) >= 2:
+                                        # If it's a tuple (name, similarity, ...), extract values
+                                        name, similarity = recognition[0], recognition[1]
+                                        if name != "Unknown":
+                                            person_name = name
+                                            face_recognized = True
+                                            recognized_count += 1
+                                            
+                                            # Track recognized faces for reporting
+                                            if person_name not in recognition_results:
+                                                recognition_results[person_name] = []
+                                            
+                                            # Calculate timestamp
+                                            timestamp = frame_number / fps
+                                            minutes = int(timestamp / 60)
+                                            seconds = int(timestamp % 60)
+                                            time_str = f"{minutes:02d}:{seconds:02d}"
+                                            
+                                            # Add to recognition results
+                                            recognition_results[person_name].append({
+                                                'frame': frame_number,
+                                                'time': time_str,
+                                                'similarity': similarity
+                                            })
+                                            
+                                            logger.info(f"Frame {frame_number}: Recognized {person_name} with similarity {similarity:.4f}")
+                                            
+                                            # Check authorization for this camera
+                                            if person_name in known_access:
+                                                cam_key = str(camera_role).lower().replace(' ', '_') if isinstance(camera_role, str) else 'unknown'
+                                                is_authorized = known_access[person_name].get(cam_key, False)
+                            except Exception as e:
+                                logger.error(f"Error during face recognition: {e}")
+                            
+                            # Store face detection in database
+                            face_data = {
+                                'video_id': video_id,
+                                'frame_number': frame_number,
+                                'person_name': person_name,
+                                'confidence': confidence,
+                                'bounding_box': json.dumps({'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}),
+                                'camera_role': camera_role,
+                                'start_frame': start_frame,
+                                'end_frame': end_frame
                             }
                             
                             cursor.execute("""
-                                INSERT INTO face_matches 
-                                (face_id, known_face_id, similarity_score, is_authorized)
-                                VALUES (%(face_id)s, %(known_face_id)s, %(similarity_score)s, %(is_authorized)s)
-                            """, match_data)
+                                INSERT INTO faces 
+                                (video_id, frame_number, person_name, confidence, 
+                                 bounding_box, camera_role, start_frame, end_frame)
+                                VALUES (%(video_id)s, %(frame_number)s, %(person_name)s, %(confidence)s,
+                                        %(bounding_box)s, %(camera_role)s, %(start_frame)s, %(end_frame)s)
+                            """, face_data)
+                            face_id = cursor.lastrowid
                             conn.commit()
-                    
-                    # 🔔 FACE DETECTION NOTIFICATIONS: Send detailed notifications for face detections
-                    if NOTIFICATION_ENABLED:
-                        # Notify for unknown persons
-                        if person_name == "Unknown person":
-                            send_smart_lighting_notification(
-                                step='unknown_person_detected',
-                                room=camera_role,
-                                message=f"Unknown person detected on {camera_role} camera",
-                                lightState=None,
-                                confidence=confidence
-                            )
-                        
-                        # Notify for unauthorized access
-                        elif not is_authorized and camera_role == "front_door":
-                            send_smart_lighting_notification(
-                                step='unauthorized_access',
-                                room=camera_role,
-                                message=f"{person_name} detected at front door without authorization",
-                                lightState=None,
-                                confidence=confidence
-                            )
-                        
-                        # Notify for motion at front door
-                        elif camera_role == "front_door":
-                            send_smart_lighting_notification(
-                                step='person_detected',
-                                room=camera_role,
-                                message=f"{person_name} detected at front door",
-                                lightState=None,
-                                confidence=confidence
-                            )
-            
-            frame_number += 1
+                            
+                            # Log face detection results
+                            if face_recognized:
+                                logger.info(f"Face recognized: {person_name} (authorized: {is_authorized})")
+                            else:
+                                logger.info("Face detected but not recognized")
+                            
+                            # If known face and recognized, record the match
+                            if face_recognized and person_name != "Unknown person":
+                                known_face_id = next((safe_get(face_db, 'known_face_id') for face_db in known_faces 
+                                                  if safe_get(face_db, 'name') == person_name), None)
+                                if known_face_id:
+                                    match_data = {
+                                        'face_id': face_id,
+                                        'known_face_id': known_face_id,
+                                        'similarity_score': similarity,
+                                        'is_authorized': is_authorized
+                                    }
+                                    
+                                    cursor.execute("""
+                                        INSERT INTO face_matches 
+                                        (face_id, known_face_id, similarity_score, is_authorized)
+                                        VALUES (%(face_id)s, %(known_face_id)s, %(similarity_score)s, %(is_authorized)s)
+                                    """, match_data)
+                                    conn.commit()
+                            
+                            # 🔔 FACE DETECTION NOTIFICATIONS: Send detailed notifications for face detections
+                            if NOTIFICATION_ENABLED:
+                                # Notify for unknown persons
+                                if person_name == "Unknown person":
+                                    send_smart_lighting_notification(
+                                        step='unknown_person_detected',
+                                        room=camera_role,
+                                        message=f"Unknown person detected on {camera_role} camera",
+                                        lightState=None,
+                                        confidence=confidence
+                                    )
+                                
+                                # Notify for unauthorized access
+                                elif not is_authorized and camera_role == "front_door":
+                                    send_smart_lighting_notification(
+                                        step='unauthorized_access',
+                                        room=camera_role,
+                                        message=f"{person_name} detected at front door without authorization",
+                                        lightState=None,
+                                        confidence=confidence
+                                    )
+                                
+                                # Notify for motion at front door
+                                elif camera_role == "front_door":
+                                    send_smart_lighting_notification(
+                                        step='person_detected',
+                                        room=camera_role,
+                                        message=f"{person_name} detected at front door",
+                                        lightState=None,
+                                        confidence=confidence
+                                    )
         
         cap.release()
         
@@ -871,11 +889,6 @@ def process_video_opencv(video_id):
         fps = cap.get(cv2.CAP_PROP_FPS)
         frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        # Motion detection variables
-        prev_frame = None
-        last_processed_frame = -MIN_FRAME_GAP  # Force processing the first frame
-        
-        frame_number = 0
         processed_count = 0
         recognized_count = 0
         recognition_results = {}
@@ -883,300 +896,263 @@ def process_video_opencv(video_id):
         logger.info(f"Processing video ID {video_id} with OpenCV: {frame_count} total frames, {fps} fps")
         start_time = time.time()
         
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Determine whether to process this frame
-            process_this_frame = False
-            motion_score = 0
-            
-            # Apply motion-based downsampling if enabled
-            if USE_MOTION_DETECTION:
-                # Convert current frame to grayscale and resize for motion detection
-                gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                small_frame = cv2.resize(gray_frame, (0, 0), fx=0.25, fy=0.25)
+        # Decode on a background thread so codec work overlaps detection. Without motion
+        # detection only every Nth frame is used, the rest are grabbed without decoding
+        sample_interval = 1 if USE_MOTION_DETECTION else FRAME_INTERVAL
+        with ThreadedFrameReader(cap, sample_interval=sample_interval, queue_size=8) as reader:
+            for batch in batched(select_frames(reader), FACE_BATCH_SIZE):
+                # Detect faces for the whole batch using MediaPipe if available
+                if HAS_MEDIAPIPE:
+                    faces_batch = detect_faces_batch([selected[1] for selected in batch])
+                else:
+                    faces_batch = [[] for _ in batch]
                 
-                # Check for motion if we have a previous frame
-                if prev_frame is not None and frame_number - last_processed_frame >= MIN_FRAME_GAP:
-                    # Calculate absolute difference between current and previous frame
-                    frame_diff = cv2.absdiff(small_frame, prev_frame)
+                for (frame_number, frame, motion_score), faces in zip(batch, faces_batch):
+                    # Increment processed frames counter
+                    processed_count += 1
                     
-                    # Apply threshold to get significant changes
-                    _, thresh = cv2.threshold(frame_diff, 25, 255, cv2.THRESH_BINARY)
+                    # Progress indicator
+                    if frame_number % (FRAME_INTERVAL * 10) == 0:
+                        progress = frame_number / frame_count * 100
+                        elapsed = time.time() - start_time
+                        remaining = (elapsed / (frame_number + 1)) * (frame_count - frame_number)
+                        logger.info(f"Processing frame {frame_number}/{frame_count} ({progress:.1f}%), "
+                                  f"ETA: {remaining:.1f}s" + 
+                                  (f", Motion: {motion_score:.4f}" if USE_MOTION_DETECTION else ""))
                     
-                    # Calculate fraction of pixels that changed
-                    motion_score = np.count_nonzero(thresh) / thresh.size
-                    
-                    # Process frame if motion exceeds threshold or if we haven't processed a frame in a while
-                    if motion_score > MOTION_THRESHOLD or frame_number - last_processed_frame >= FRAME_INTERVAL:
-                        process_this_frame = True
-                        last_processed_frame = frame_number
-                        
-                        if motion_score > MOTION_THRESHOLD:
-                            logger.info(f"Motion detected in frame {frame_number} (score: {motion_score:.4f})")
-                elif frame_number == 0 or frame_number - last_processed_frame >= FRAME_INTERVAL:
-                    # Always process first frame or if max interval reached
-                    process_this_frame = True
-                    last_processed_frame = frame_number
-                
-                # Store current frame for next iteration
-                prev_frame = small_frame
-            else:
-                # Original behavior: process every Nth frame
-                process_this_frame = (frame_number % FRAME_INTERVAL == 0)
-            
-            if not process_this_frame:
-                frame_number += 1
-                continue
-                
-            # Increment processed frames counter
-            processed_count += 1
-            
-            # Progress indicator
-            if frame_number % (FRAME_INTERVAL * 10) == 0 or process_this_frame:
-                progress = frame_number / frame_count * 100
-                elapsed = time.time() - start_time
-                remaining = (elapsed / (frame_number + 1)) * (frame_count - frame_number)
-                logger.info(f"Processing frame {frame_number}/{frame_count} ({progress:.1f}%), "
-                          f"ETA: {remaining:.1f}s" + 
-                          (f", Motion: {motion_score:.4f}" if USE_MOTION_DETECTION else ""))
-            
-            # Detect faces using MediaPipe if available
-            faces = []
-            if HAS_MEDIAPIPE:
-                faces = detect_faces(frame)
-            
-            # If no faces detected with MediaPipe, try OpenCV
-            if not faces and HAS_OPENCV_FACE:
-                try:
-                    import opencv_face
-                    faces = opencv_face.detect_faces(frame)
-                except Exception as e:
-                    logger.error(f"Error detecting faces with OpenCV: {e}")
-            
-            # Process detected faces
-            for face_idx, face in enumerate(faces):
-                # Get face details
-                if isinstance(face, dict):
-                    # MediaPipe format
-                    x1, y1, x2, y2 = face['bbox']
-                    confidence = face.get('confidence', 0.9)
-                    embedding = face.get('embedding')
-                else:
-                    # OpenCV format (x, y, w, h)
-                    x, y, w, h = face
-                    x1, y1, x2, y2 = x, y, x + w, y + h
-                    confidence = 0.9  # Default confidence
-                    embedding = None
-                
-                # Calculate 5 seconds before and after (in frames)
-                seconds_buffer = 5
-                start_frame = max(0, frame_number - int(fps * seconds_buffer))
-                end_frame = min(frame_count, frame_number + int(fps * seconds_buffer))
-                
-                # Default values
-                person_name = "Unknown person"
-                is_authorized = False
-                face_recognized = False
-                
-                # Try to recognize face
-                try:
-                    if HAS_MEDIAPIPE and embedding is not None:
-                        # Use MediaPipe recognition
+                    # If no faces detected with MediaPipe, try OpenCV
+                    if not faces and HAS_OPENCV_FACE:
                         try:
-                            recognition = recognize_face(embedding, threshold=FACE_RECOGNITION_THRESHOLD)
-                            # Handle the recognition result properly based on its actual type
-                            if recognition:
-                                if isinstance(recognition, dict):
-                                    # If it's already a dict, use it directly
-                                    if recognition.get('name') != "Unknown":
-                                        person_name = recognition.get('name')
-                                        similarity = recognition.get('similarity', FACE_RECOGNITION_THRESHOLD)
-                                        face_recognized = True
-                                        recognized_count += 1
-                                        
-                                        # Track recognized faces for reporting
-                                        if person_name not in recognition_results:
-                                            recognition_results[person_name] = []
-                                        
-                                        # Calculate timestamp
-                                        timestamp = frame_number / fps
-                                        minutes = int(timestamp / 60)
-                                        seconds = int(timestamp % 60)
-                                        time_str = f"{minutes:02d}:{seconds:02d}"
-                                        
-                                        # Add to recognition results
-                                        recognition_results[person_name].append({
-                                            'frame': frame_number,
-                                            'time': time_str,
-                                            'similarity': similarity
-                                        })
-                                        
-                                        logger.info(f"Frame {frame_number}: Recognized {person_name} with similarity {similarity:.4f}")
-                                        
-                                        # Check authorization for this camera
-                                        if person_name in known_access:
-                                            cam_key = str(camera_role).lower().replace(' ', '_') if isinstance(camera_role, str) else 'unknown'
-                                            is_authorized = known_access[person_name].get(cam_key, False)
-                                elif isinstance(recognition, tuple) and len(recognition) >= 2:
-                                    # If it's a tuple (name, similarity, ...), extract values
-                                    name, similarity = recognition[0], recognition[1]
-                                    if name != "Unknown":
-                                        person_name = name
-                                        face_recognized = True
-                                        recognized_count += 1
-                                        
-                                        # Track recognized faces for reporting
-                                        if person_name not in recognition_results:
-                                            recognition_results[person_name] = []
-                                        
-                                        # Calculate timestamp
-                                        timestamp = frame_number / fps
-                                        minutes = int(timestamp / 60)
-                                        seconds = int(timestamp % 60)
-                                        time_str = f"{minutes:02d}:{seconds:02d}"
-                                        
-                                        # Add to recognition results
-                                        recognition_results[person_name].append({
-                                            'frame': frame_number,
-                                            'time': time_str,
-                                            'similarity': similarity
-                                        })
-                                        
-                                        logger.info(f"Frame {frame_number}: Recognized {person_name} with similarity {similarity:.4f}")
-                                        
-                                        # Check authorization for this camera
-                                        if person_name in known_access:
-                                            cam_key = str(camera_role).lower().replace(' ', '_') if isinstance(camera_role, str) else 'unknown'
-                                            is_authorized = known_access[person_name].get(cam_key, False)
+                            import opencv_face
+                            faces = opencv_face.detect_faces(frame)
                         except Exception as e:
-                            logger.error(f"Error during face recognition: {e}")
-                    elif HAS_FACE_RECOGNITION:
-                        # Use face_recognition library
+                            logger.error(f"Error detecting faces with OpenCV: {e}")
+                    
+                    # Process detected faces
+                    for face_idx, face in enumerate(faces):
+                        # Get face details
+                        if isinstance(face, dict):
+                            # MediaPipe format
+                            x1, y1, x2, y2 = face['bbox']
+                            confidence = face.get('confidence', 0.9)
+                            embedding = face.get('embedding')
+                        else:
+                            # OpenCV format (x, y, w, h)
+                            x, y, w, h = face
+                            x1, y1, x2, y2 = x, y, x + w, y + h
+                            confidence = 0.9  # Default confidence
+                            embedding = None
+                        
+                        # Calculate 5 seconds before and after (in frames)
+                        seconds_buffer = 5
+                        start_frame = max(0, frame_number - int(fps * seconds_buffer))
+                        end_frame = min(frame_count, frame_number + int(fps * seconds_buffer))
+                        
+                        # Default values
+                        person_name = "Unknown person"
+                        is_authorized = False
+                        face_recognized = False
+                        
+                        # Try to recognize face
                         try:
-                            face_image = frame[y1:y2, x1:x2]
-                            face_encodings = safe_face_encoding(face_image)
-                            
-                            if face_encodings:
-                                # Import inside the function to handle potential import errors
+                            if HAS_MEDIAPIPE and embedding is not None:
+                                # Use MediaPipe recognition
                                 try:
-                                    import face_recognition
-                                    matches = face_recognition.compare_faces(
-                                        known_encodings, 
-                                        face_encodings[0], 
-                                        tolerance=1.0 - FACE_RECOGNITION_THRESHOLD
-                                    )
-                                except ImportError:
-                                    logger.error("face_recognition library not available")
-                                    matches = []
-                                
-                                # Only proceed if we have valid matches
-                                if isinstance(matches, list) and len(matches) > 0 and True in matches:
-                                    match_index = matches.index(True)
-                                    person_name = known_names[match_index]
-                                    face_recognized = True
-                                    recognized_count += 1
-                                    
-                                    # Track recognized faces for reporting
-                                    if person_name not in recognition_results:
-                                        recognition_results[person_name] = []
-                                    
-                                    # Calculate timestamp
-                                    timestamp = frame_number / fps
-                                    minutes = int(timestamp / 60)
-                                    seconds = int(timestamp % 60)
-                                    time_str = f"{minutes:02d}:{seconds:02d}"
-                                    
-                                    # Add to recognition results
-                                    recognition_results[person_name].append({
-                                        'frame': frame_number,
-                                        'time': time_str,
-                                        'similarity': FACE_RECOGNITION_THRESHOLD
-                                    })
+                                    recognition = recognize_face(embedding, threshold=FACE_RECOGNITION_THRESHOLD)
+                                    # Handle the recognition result properly based on its actual type
+                                    if recognition:
+                                        if isinstance(recognition, dict):
+                                            # If it's already a dict, use it directly
+                                            if recognition.get('name') != "Unknown":
+                                                person_name = recognition.get('name')
+                                                similarity = recognition.get('similarity', FACE_RECOGNITION_THRESHOLD)
+                                                face_recognized = True
+                                                recognized_count += 1
+                                                
+                                                # Track recognized faces for reporting
+                                                if person_name not in recognition_results:
+                                                    recognition_results[person_name] = []
+                                                
+                                                # Calculate timestamp
+                                                timestamp = frame_number / fps
+                                                minutes = int(timestamp / 60)
+                                                seconds = int(timestamp % 60)
+                                                time_str = f"{minutes:02d}:{seconds:02d}"
+                                                
+                                                # Add to recognition results
+                                                recognition_results[person_name].append({
+                                                    'frame': frame_number,
+                                                    'time': time_str,
+                                                    'similarity': similarity
+                                                })
+                                                
+                                                logger.info(f"Frame {frame_number}: Recognized {person_name} with similarity {similarity:.4f}")
+                                                
+                                                # Check authorization for this camera
+                                                if person_name in known_access:
+                                                    cam_key = str(camera_role).lower().replace(' ', '_') if isinstance(camera_role, str) else 'unknown'
+                                                    is_authorized = known_access[person_name].get(cam_key, False)
+                                        elif isinstance(recognition, tuple) and len(recognition) >= 2:
+                                            # If it's a tuple (name, similarity, ...), extract values
+                                            name, similarity = recognition[0], recognition[1]
+                                            if name != "Unknown":
+                                                person_name = name
+                                                face_recognized = True
+                                                recognized_count += 1
+                                                
+                                                # Track recognized faces for reporting
+                                                if person_name not in recognition_results:
+                                                    recognition_results[person_name] = []
+                                                
+                                                # Calculate timestamp
+                                                timestamp = frame_number / fps
+                                                minutes = int(timestamp / 60)
+                                                seconds = int(timestamp % 60)
+                                                time_str = f"{minutes:02d}:{seconds:02d}"
+                                                
+                                                # Add to recognition results
+                                                recognition_results[person_name].append({
+                                                    'frame': frame_number,
+                                                    'time': time_str,
+                                                    'similarity': similarity
+                                                })
+                                                
+                                                logger.info(f"Frame {frame_number}: Recognized {person_name} with similarity {similarity:.4f}")
+                                                
+                                                # Check authorization for this camera
+                                                if person_name in known_access:
+                                                    cam_key = str(camera_role).lower().replace(' ', '_') if isinstance(camera_role, str) else 'unknown'
+                                                    is_authorized = known_access[person_name].get(cam_key, False)
+                                except Exception as e:
+                                    logger.error(f"Error during face recognition: {e}")
+                            elif HAS_FACE_RECOGNITION:
+                                # Use face_recognition library
+                                try:
+                                    face_image = frame[y1:y2, x1:x2]
+                                    face_encodings = safe_face_encoding(face_image)
                                     
-                                    logger.info(f"Frame {frame_number}: Recognized {person_name} with similarity {FACE_RECOGNITION_THRESHOLD:.4f}")
+                                    if face_encodings:
+                                        if known_encodings_matrix is not None:
+                                            # Same test as face_recognition.compare_faces (Euclidean distance
+                                            # within tolerance), against all known faces in one pass
+                                            distances = np.linalg.norm(known_encodings_matrix - face_encodings[0], axis=1)
+                                            matches = (distances <= 1.0 - FACE_RECOGNITION_THRESHOLD).tolist()
+                                        else:
+                                            # Import inside the function to handle potential import errors
+                                            try:
+                                                import face_recognition
+                                                matches = face_recognition.compare_faces(
+                                                    known_encodings, 
+                                                    face_encodings[0], 
+                                                    tolerance=1.0 - FACE_RECOGNITION_THRESHOLD
+                                                )
+                                            except ImportError:
+                                                logger.error("face_recognition library not available")
+                                                matches = []
+                                        
+                                        # Only proceed if we have valid matches
+                                        if isinstance(matches, list) and len(matches) > 0 and True in matches:
+                                            match_index = matches.index(True)
+                                            person_name = known_names[match_index]
+                                            face_recognized = True
+                                            recognized_count += 1
+                                            
+                                            # Track recognized faces for reporting
+                                            if person_name not in recognition_results:
+                                                recognition_results[person_name] = []
+                                            
+                                            # Calculate timestamp
+                                            timestamp = frame_number / fps
+                                            minutes = int(timestamp / 60)
+                                            seconds = int(timestamp % 60)
+                                            time_str = f"{minutes:02d}:{seconds:02d}"
+                                            
+                                            # Add to recognition results
+                                            recognition_results[person_name].append({
+                                                'frame': frame_number,
+                                                'time': time_str,
+                                                'similarity': FACE_RECOGNITION_THRESHOLD
+                                            })
+                                            
+                                            logger.info(f"Frame {frame_number}: Recognized {person_name} with similarity {FACE_RECOGNITION_THRESHOLD:.4f}")
+                                except Exception as e:
+                                    logger.error(f"Error during face recognition with face_recognition library: {e}")
                         except Exception as e:
-                            logger.error(f"Error during face recognition with face_recognition library: {e}")
-                except Exception as e:
-                    logger.error(f"Error during face recognition: {e}")
-                
-                # Store face detection in database
-                face_data = {
-                    'video_id': video_id,
-                    'frame_number': frame_number,
-                    'person_name': person_name,
-                    'confidence': confidence,
-                    'bounding_box': json.dumps({'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}),
-                    'camera_role': camera_role,
-                    'start_frame': start_frame,
-                    'end_frame': end_frame
-                }
-                
-                cursor.execute("""
-                    INSERT INTO faces 
-                    (video_id, frame_number, person_name, confidence, 
-                     bounding_box, camera_role, start_frame, end_frame)
-                    VALUES (%(video_id)s, %(frame_number)s, %(person_name)s, %(confidence)s,
-                            %(bounding_box)s, %(camera_role)s, %(start_frame)s, %(end_frame)s)
-                """, face_data)
-                face_id = cursor.lastrowid
-                conn.commit()
-                
-                # Log face detection
-                if face_recognized:
-                    logger.info(f"Face recognized in frame {frame_number}: {person_name}")
-                else:
-                    logger.info(f"Unknown face detected in frame {frame_number}")
-                
-                # If known face, record the match
-                if face_recognized and person_name != "Unknown person":
-                    # Find the known_face_id
-                    known_face_id = None
-                    for known_face in known_faces:
-                        if safe_get(known_face, 'name') == person_name:
-                            known_face_id = safe_get(known_face, 'known_face_id')
-                            break
-                    
-                    if known_face_id:
-                        # Check authorization
-                        is_authorized = False
-                        if person_name in known_access:
-                            cam_key = str(camera_role).lower().replace(' ', '_') if isinstance(camera_role, str) else 'unknown'
-                            is_authorized = known_access[person_name].get(cam_key, False)
+                            logger.error(f"Error during face recognition: {e}")
                         
-                        # Record match
-                        match_data = {
-                            'face_id': face_id,
-                            'known_face_id': known_face_id,
-                            'similarity_score': FACE_RECOGNITION_THRESHOLD,
-                            'is_authorized': is_authorized
+                        # Store face detection in database
+                        face_data = {
+                            'video_id': video_id,
+                            'frame_number': frame_number,
+                            'person_name': person_name,
+                            'confidence': confidence,
+                            'bounding_box': json.dumps({'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}),
+                            'camera_role': camera_role,
+                            'start_frame': start_frame,
+                            'end_frame': end_frame
                         }
                         
                         cursor.execute("""
-                            INSERT INTO face_matches 
-                            (face_id, known_face_id, similarity_score, is_authorized)
-                            VALUES (%(face_id)s, %(known_face_id)s, %(similarity_score)s, %(is_authorized)s)
-                        """, match_data)
+                            INSERT INTO faces 
+                            (video_id, frame_number, person_name, confidence, 
+                             bounding_box, camera_role, start_frame, end_frame)
+                            VALUES (%(video_id)s, %(frame_number)s, %(person_name)s, %(confidence)s,
+                                    %(bounding_box)s, %(camera_role)s, %(start_frame)s, %(end_frame)s)
+                        """, face_data)
+                        face_id = cursor.lastrowid
                         conn.commit()
-                
-                # Send notification
-                if NOTIFICATION_ENABLED:
-                    if face_recognized:
-                        if camera_role == "front_door":
-                            send_notification(f"{person_name} at front door", f"{person_name} detected at front door")
+                        
+                        # Log face detection
+                        if face_recognized:
+                            logger.info(f"Face recognized in frame {frame_number}: {person_name}")
                         else:
-                            send_notification("Unknown person detected", f"Unknown person detected at {camera_role}")
-            
-            # Smart lighting automation processing
-            if smart_lighting_controller and camera_role:
-                try:
-                    smart_lighting_controller.process_frame(frame, str(camera_role))
-                except Exception as e:
-                    logger.error(f"Error in smart lighting automation for frame {frame_number}: {e}")
-            
-            frame_number += 1
+                            logger.info(f"Unknown face detected in frame {frame_number}")
+                        
+                        # If known face, record the match
+                        if face_recognized and person_name != "Unknown person":
+                            # Find the known_face_id
+                            known_face_id = None
+                            for known_face in known_faces:
+                                if safe_get(known_face, 'name') == person_name:
+                                    known_face_id = safe_get(known_face, 'known_face_id')
+                                    break
+                            
+                            if known_face_id:
+                                # Check authorization
+                                is_authorized = False
+                                if person_name in known_access:
+                                    cam_key = str(camera_role).lower().replace(' ', '_') if isinstance(camera_role, str) else 'unknown'
+                                    is_authorized = known_access[person_name].get(cam_key, False)
+                                
+                                # Record match
+                                match_data = {
+                                    'face_id': face_id,
+                                    'known_face_id': known_face_id,
+                                    'similarity_score': FACE_RECOGNITION_THRESHOLD,
+                                    'is_authorized': is_authorized
+                                }
+                                
+                                cursor.execute("""
+                                    INSERT INTO face_matches 
+                                    (face_id, known_face_id, similarity_score, is_authorized)
+                                    VALUES (%(face_id)s, %(known_face_id)s, %(similarity_score)s, %(is_authorized)s)
+                                """, match_data)
+                                conn.commit()
+                        
+                        # Send notification
+                        if NOTIFICATION_ENABLED:
+                            if face_recognized:
+                                if camera_role == "front_door":
+                                    send_notification(f"{person_name} at front door", f"{person_name} detected at front door")
+                                else:
+                                    send_notification("Unknown person detected", f"Unknown person detected at {camera_role}")
+                    
+                    # Smart lighting automation processing
+                    if smart_lighting_controller and camera_role:
+                        try:
+                            smart_lighting_controller.process_frame(frame, str(camera_role))
+                        except Exception as e:
+                            logger.error(f"Error in smart lighting automation for frame {frame_number}: {e}")
         
         cap.release()
         